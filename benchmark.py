@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict
+from http_utils import TokenBucket
+from mock_server import MockServer, generate_workspace
+
+
+def run_benchmark(
+    contexts: int = 5,
+    breadth: int = 10,
+    depth: int = 3,
+    unit_density: float = 0.2,
+    subpage_ratio: float = 0.1,
+    vocabulary: int = 200,
+    latency: float = 0.02,
+    server_rate_limit: float = None,
+    client_rate: float = 1000.0,
+    client_burst: int = 100,
+    runs: int = 2,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    generate a workspace, serve it locally and time full refresh runs of SyntheticOperation against it.
+    the first run starts from cold local state; later runs show the incremental (no changes) cost.
+    """
+    os.environ.setdefault("NOTION_KEY", "mock-notion-key")
+    os.environ.setdefault("MERRIAM_WEBSTER_KEY", "mock-mw-key")
+    # imported here so the keys above are in place before main reads them
+    from main import SyntheticOperation
+
+    workspace = generate_workspace(
+        SyntheticOperation.MAINDATABASE_ID,
+        SyntheticOperation.WORDDATABASE_ID,
+        SyntheticOperation.EXPRDATABASE_ID,
+        contexts=contexts,
+        breadth=breadth,
+        depth=depth,
+        unit_density=unit_density,
+        subpage_ratio=subpage_ratio,
+        vocabulary=vocabulary,
+        seed=seed,
+    )
+    server = MockServer(workspace, latency=latency, rate_limit=server_rate_limit).start()
+    report = {"workspace": {"blocks": len(workspace.blocks), "pages": len(workspace.pages)}, "runs": []}
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            # local state files (unit index, caches, sync state) are written to the working directory
+            os.chdir(state_dir)
+            operation = SyntheticOperation()
+            notion = operation.CEpages.notion_api_call
+            notion.BASE_URL = server.notion_base_url
+            notion.rate_limiter = TokenBucket(client_rate, client_burst)
+            operation.WMapi.BASE_URL = server.mw_base_url
+            operation.WMapi.rate_limiter = TokenBucket(client_rate, client_burst)
+            for run in range(runs):
+                server.reset_counts()
+                started = time.perf_counter()
+                operation.refresh_units_database_with_contexts()
+                wall_time = time.perf_counter() - started
+                requests_issued = server.total_requests()
+                report["runs"].append(
+                    {
+                        "run": run + 1,
+                        "wall_time_s": round(wall_time, 3),
+                        "requests": requests_issued,
+                        "requests_per_s": round(requests_issued / wall_time, 1) if wall_time else 0.0,
+                        "rate_limited": server.requests.get("429", 0),
+                        "by_route": dict(sorted(server.requests.items())),
+                    }
+                )
+    finally:
+        os.chdir(cwd)
+        server.stop()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end refresh benchmark against a local mock workspace.")
+    parser.add_argument("--contexts", type=int, default=5)
+    parser.add_argument("--breadth", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--unit-density", type=float, default=0.2)
+    parser.add_argument("--subpage-ratio", type=float, default=0.1)
+    parser.add_argument("--vocabulary", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="server-side seconds added to each request")
+    parser.add_argument("--server-rate-limit", type=float, default=None, help="answer 429 above this many req/s")
+    parser.add_argument("--client-rate", type=float, default=1000.0, help="client token bucket rate in req/s")
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the full report as json")
+    args = parser.parse_args()
+    report = run_benchmark(
+        contexts=args.contexts,
+        breadth=args.breadth,
+        depth=args.depth,
+        unit_density=args.unit_density,
+        subpage_ratio=args.subpage_ratio,
+        vocabulary=args.vocabulary,
+        latency=args.latency,
+        server_rate_limit=args.server_rate_limit,
+        client_rate=args.client_rate,
+        runs=args.runs,
+        seed=args.seed,
+    )
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print(f"workspace: {report['workspace']['blocks']} blocks, {report['workspace']['pages']} pages")
+        for run in report["runs"]:
+            print(
+                f"run {run['run']}: {run['wall_time_s']:.3f}s, {run['requests']} requests, "
+                f"{run['requests_per_s']} req/s, {run['rate_limited']} rate limited"
+            )
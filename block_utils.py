@@ -0,0 +1,101 @@
+import functools
+from typing import Any, Dict, List, Optional, Tuple
+from settings import _NotionObject
+
+# builders of the block and property objects sent to Notion. blocks that never vary (dividers, section headings) are
+# built once and shared between pages; they are only ever serialized, so never mutate what these functions return.
+
+_DEFAULT_ANNOTATIONS: Dict[str, Any] = {
+    "bold": False,
+    "italic": False,
+    "strikethrough": False,
+    "underline": False,
+    "code": False,
+    "color": "default",
+}
+
+
+def text_run(text: str, link: Optional[str] = None, **annotations) -> Dict[str, Any]:
+    """a rich_text run; annotations not given keep Notion's defaults and are left out when none are given"""
+    run = {"type": "text", "text": {"content": text, "link": {"url": link} if link else None}}
+    if annotations:
+        run["annotations"] = {**_DEFAULT_ANNOTATIONS, **annotations}
+    return run
+
+
+def _heading(level: int, text: str = "", rich_text: Optional[List[Dict[str, Any]]] = None) -> _NotionObject:
+    block_type = f"heading_{level}"
+    return {
+        "object": "block",
+        "type": block_type,
+        block_type: {"rich_text": rich_text or [text_run(text)], "color": "default", "is_toggleable": False},
+    }
+
+
+@functools.lru_cache(maxsize=64)
+def heading_2(text: str) -> _NotionObject:
+    """shared per text: the same few section headings open every unit page"""
+    return _heading(2, text)
+
+
+def heading_3(text: str = "", rich_text: Optional[List[Dict[str, Any]]] = None) -> _NotionObject:
+    return _heading(3, text, rich_text)
+
+
+def bulleted_list_item(text: str, link: Optional[str] = None) -> _NotionObject:
+    return {
+        "object": "block",
+        "type": "bulleted_list_item",
+        "bulleted_list_item": {"rich_text": [text_run(text, link)], "color": "default"},
+    }
+
+
+def paragraph(text: str, link: Optional[str] = None, color: str = "default", italic: bool = False) -> _NotionObject:
+    return {
+        "object": "block",
+        "type": "paragraph",
+        "paragraph": {"rich_text": [text_run(text, link, italic=italic)], "color": color},
+    }
+
+
+def embed(url: str) -> _NotionObject:
+    return {"object": "block", "type": "embed", "embed": {"url": url}}
+
+
+DIVIDER: _NotionObject = {"object": "block", "type": "divider", "divider": {}}
+
+
+def context_paragraph(unit_name: str, unit_url: str) -> _NotionObject:
+    """the link back to one occurrence of a unit, as appended under the Context heading of its page"""
+    return {"type": "paragraph", "paragraph": {"rich_text": [text_run(unit_name, unit_url)]}}
+
+
+def unit_properties(title: str, pronunciations: Optional[List[str]] = None) -> Dict[str, Any]:
+    properties = {"title": {"title": [{"text": {"content": title}}]}}
+    if pronunciations:
+        properties["Pronunciation"] = {"rich_text": [{"text": {"content": f"\\{pr}\\ "}} for pr in pronunciations]}
+    return properties
+
+
+def unit_page(unit_name: str, simple_dicts: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[_NotionObject]]:
+    """
+    (properties, children) of a new unit page: one section per dictionary entry (MerriamWebsterAPI.response_to_CE
+    form), then the heading contexts are appended under. An expression (no entries) only gets the heading.
+    """
+    if not simple_dicts:
+        return unit_properties(unit_name), [heading_2("Contexts")]
+    properties = unit_properties(simple_dicts[0]["show_word"], [pr["mw"] for pr in simple_dicts[0]["prs"]])
+    children: List[_NotionObject] = []
+    for idx, entry in enumerate(simple_dicts):
+        headword = text_run(f"{idx + 1}. {entry['hw']}")
+        function_label = text_run(" " + entry["fl"], color="gray", italic=True)
+        children.append(heading_3(rich_text=[headword, function_label]))
+        for pr in entry["prs"]:
+            if pr["mw"]:
+                children.append(paragraph(pr["mw"]))
+            if pr["sound"]:
+                children.append(embed(pr["sound"]))
+        children.extend(bulleted_list_item(definition) for definition in entry["defs"])
+        children.append(DIVIDER)
+    children.append(heading_2("Context"))
+    return properties, children
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache with optional TTL and in-flight coalescing: concurrent loads of the same key
+    share a single call to the loader. Entries can be scoped to a run (clear() between runs) or to a TTL.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple] = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._inflight_async: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _lookup(self, key: Hashable):
+        """Return (found, value); caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value: Any):
+        """caller holds the lock"""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            found, value = self._lookup(key)
+            return value if found else default
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = self._inflight[key] = Future()
+                owner = True
+        if not owner:
+            return future.result()
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            # an invalidate() during the load drops the in-flight marker, and the stale value must not be stored
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+                self._store(key, value)
+        future.set_result(value)
+        return value
+
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            future = self._inflight_async.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = self._inflight_async[key] = asyncio.get_running_loop().create_future()
+                owner = True
+        if not owner:
+            return await asyncio.shield(future)
+        try:
+            value = await loader()
+        except BaseException as e:
+            with self._lock:
+                if self._inflight_async.get(key) is future:
+                    del self._inflight_async[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # mark the exception retrieved when no other caller is waiting on it
+                future.exception()
+            raise
+        with self._lock:
+            if self._inflight_async.get(key) is future:
+                del self._inflight_async[key]
+                self._store(key, value)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+            self._inflight.pop(key, None)
+            self._inflight_async.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._inflight.clear()
+            self._inflight_async.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+            }
+
+
+class DiskCache:
+    """
+    Persistent key -> json value store on SQLite with a default TTL (overridable per entry) and size-bounded eviction
+    of the least recently used entries. Safe to share between threads.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = 30 * 24 * 3600, max_entries: int = 50_000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        # running entry count, so a put costs no COUNT(*); other processes sharing the file are only seen at eviction
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                if row is not None:
+                    self._count -= self._conn.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = -1):
+        """ttl=-1 uses the cache default, None never expires"""
+        ttl = self.ttl if ttl == -1 else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM cache WHERE key = ?", (key,)).fetchone() is None:
+                self._count += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            self._evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._count -= self._conn.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount
+
+    def _evict(self):
+        """caller holds the lock"""
+        if self._count <= self.max_entries:
+            return
+        self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+        self._conn.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT "
+            "max(0, (SELECT COUNT(*) FROM cache) - ?))",
+            (self.max_entries,),
+        )
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
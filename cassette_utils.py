@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+import requests
+from requests.structures import CaseInsensitiveDict
+from http_utils import HTTPTransport
+
+# query parameters that carry credentials and are never written to a cassette
+_SECRET_PARAMS = frozenset({"key"})
+# response headers worth replaying; everything else is dropped to keep cassettes small
+_KEPT_HEADERS = ("Content-Type", "Retry-After")
+_HEADER = struct.Struct(">I")
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode when a request has no recorded response."""
+
+    pass
+
+
+def request_key(method: str, url: str, body: Any = None) -> Tuple[str, str]:
+    """
+    return (exact_key, loose_key) of a request: the exact key covers method, url and body, the loose key only method
+    and url, so requests whose body embeds a timestamp (e.g. last_edited_time filters) still find a recording.
+    """
+    parsed = urlparse(url)
+    query = urlencode([(name, value) for name, value in parse_qsl(parsed.query) if name not in _SECRET_PARAMS])
+    loose_key = f"{method} {urlunparse(parsed._replace(scheme='', netloc='', query=query))}"
+    body_hash = hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16] if body is not None else "-"
+    return f"{loose_key} {body_hash}", loose_key
+
+
+class Cassette:
+    """
+    Append-only file of request/response records. Each record is a frame [key length][key][payload length][payload]
+    where the payload is zlib-compressed json; opening a cassette scans the frame headers only to build an offset
+    index, and a frame cut short by a crash is ignored. Scheme and host are not part of the key, so a cassette
+    recorded against Notion replays against any base url.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # exact key -> [offsets], loose key -> [offsets], in recording order
+        self._exact: Dict[str, List[int]] = {}
+        self._loose: Dict[str, List[int]] = {}
+        self._end = 0
+        if os.path.exists(path):
+            self._scan()
+
+    def _scan(self):
+        file_size = os.path.getsize(self.path)
+        with open(self.path, "rb") as f:
+            while True:
+                offset = f.tell()
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                key = f.read(_HEADER.unpack(header)[0])
+                size_bytes = f.read(_HEADER.size)
+                if len(size_bytes) < _HEADER.size:
+                    break
+                size = _HEADER.unpack(size_bytes)[0]
+                if f.tell() + size > file_size:
+                    break
+                f.seek(size, os.SEEK_CUR)
+                self._index(key.decode(), offset)
+                self._end = f.tell()
+
+    def _index(self, exact_key: str, offset: int):
+        loose_key = exact_key.rsplit(" ", 1)[0]
+        self._exact.setdefault(exact_key, []).append(offset)
+        self._loose.setdefault(loose_key, []).append(offset)
+
+    def __len__(self) -> int:
+        return sum(len(offsets) for offsets in self._exact.values())
+
+    def append(self, exact_key: str, record: Dict[str, Any]):
+        key = exact_key.encode()
+        payload = zlib.compress(json.dumps(record, separators=(",", ":")).encode())
+        frame = _HEADER.pack(len(key)) + key + _HEADER.pack(len(payload)) + payload
+        with self._lock:
+            with open(self.path, "ab") as f:
+                # drop a partial frame left by an interrupted run before appending
+                if f.tell() != self._end:
+                    f.truncate(self._end)
+                f.write(frame)
+            self._index(exact_key, self._end)
+            self._end += len(frame)
+
+    def read(self, offset: int) -> Dict[str, Any]:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            f.seek(_HEADER.unpack(f.read(_HEADER.size))[0], os.SEEK_CUR)
+            size = _HEADER.unpack(f.read(_HEADER.size))[0]
+            return json.loads(zlib.decompress(f.read(size)))
+
+    def offsets(self, exact_key: str, loose_key: str) -> List[int]:
+        return self._exact.get(exact_key) or self._loose.get(loose_key) or []
+
+
+class RecordingTransport:
+    """HTTPTransport wrapper that appends every request/response pair it carries to a cassette."""
+
+    def __init__(self, cassette: Cassette, transport: Optional[HTTPTransport] = None):
+        self.cassette = cassette
+        self.transport = transport or HTTPTransport()
+        self.pool_size = self.transport.pool_size
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        started = time.perf_counter()
+        response = self.transport.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        exact_key, _ = request_key(method, url, kwargs.get("json"))
+        record = {
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers},
+            "body": response.content.decode("utf-8", errors="replace"),
+            "elapsed": round(elapsed, 4),
+        }
+        self.cassette.append(exact_key, record)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayTransport:
+    """
+    Serves requests from a cassette without any network. Repeated identical requests get the recorded responses in
+    recording order (the last one is reused once exhausted). Each response is delayed by latency_scale times the
+    recorded latency, plus a fixed latency; both default to 0. Local state (sync store, unit index, caches) changes
+    which requests a run makes, so replay from the same starting state the recording had.
+    """
+
+    def __init__(self, cassette: Cassette, latency_scale: float = 0.0, latency: float = 0.0, pool_size: int = 10):
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+        self.latency = latency
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._served: Dict[str, int] = {}
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        body = kwargs.get("json")
+        exact_key, loose_key = request_key(method, url, body)
+        offsets = self.cassette.offsets(exact_key, loose_key)
+        if not offsets:
+            raise CassetteMissError(f"No recorded response for {exact_key}.")
+        with self._lock:
+            served = self._served.get(exact_key, 0)
+            self._served[exact_key] = served + 1
+        record = self.cassette.read(offsets[min(served, len(offsets) - 1)])
+        delay = self.latency + self.latency_scale * record["elapsed"]
+        if delay > 0:
+            time.sleep(delay)
+        response = requests.Response()
+        response.status_code = record["status"]
+        response._content = record["body"].encode()
+        response.headers = CaseInsensitiveDict(record["headers"])
+        response.encoding = "utf-8"
+        response.url = url
+        response.request = requests.Request(method, url, json=body).prepare()
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,117 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from settings import _NotionObject
+from record_utils import TextRun, rich_text_runs
+
+# bit of each annotation in a run's annotation mask
+_ANNOTATION_BITS: Dict[str, int] = {"bold": 1, "italic": 2, "strikethrough": 4, "underline": 8, "code": 16}
+
+
+def _annotation_mask(run: TextRun) -> int:
+    return (
+        (run.bold and 1)
+        | (run.italic and 2)
+        | (run.strikethrough and 4)
+        | (run.underline and 8)
+        | (run.code and 16)
+    )
+
+
+class UnitRule:
+    """
+    One way of marking a unit in a context page: a rich_text run counts as a unit when its block type is one of
+    block_types (any type when None), every annotation given as True/False has that value (None: don't care) and its
+    color is one of colors (any color when None).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        block_types: Optional[Iterable[str]] = None,
+        bold: Optional[bool] = None,
+        italic: Optional[bool] = None,
+        strikethrough: Optional[bool] = None,
+        underline: Optional[bool] = None,
+        code: Optional[bool] = None,
+        colors: Optional[Iterable[str]] = None,
+    ):
+        self.name = name
+        self.block_types = frozenset(block_types) if block_types is not None else None
+        self.annotations = {
+            "bold": bold,
+            "italic": italic,
+            "strikethrough": strikethrough,
+            "underline": underline,
+            "code": code,
+        }
+        self.colors = frozenset(colors) if colors is not None else None
+
+    def compile(self) -> Tuple[int, int, Optional[frozenset]]:
+        """(mask, value, colors): a run matches when annotation_mask & mask == value and its color is in colors"""
+        mask = value = 0
+        for annotation, required in self.annotations.items():
+            if required is not None:
+                mask |= _ANNOTATION_BITS[annotation]
+                if required:
+                    value |= _ANNOTATION_BITS[annotation]
+        return mask, value, self.colors
+
+    def __repr__(self) -> str:
+        return f"UnitRule({self.name!r})"
+
+
+# the convention the unit databases were built with: a bold and italic run in a bulleted list item
+DEFAULT_UNIT_RULES: Tuple[UnitRule, ...] = (
+    UnitRule("bold_italic_bullet", block_types=("bulleted_list_item",), bold=True, italic=True),
+)
+
+
+class UnitMatcher:
+    """
+    All unit rules compiled into one lookup: rules are bucketed by block type, so a block whose type no rule names is
+    dropped with a single dict lookup, and the runs of the other blocks are scanned once, each run's annotations
+    reduced to a bit mask and tested against every candidate rule. Adding a rule adds a mask test, not a pass.
+    """
+
+    def __init__(self, rules: Iterable[UnitRule] = DEFAULT_UNIT_RULES):
+        self.rules = tuple(rules)
+        wildcard = [rule.compile() for rule in self.rules if rule.block_types is None]
+        block_types = set().union(*(rule.block_types for rule in self.rules if rule.block_types is not None))
+        # block type -> compiled rules that apply to it, in rule order; other types only see the wildcard rules
+        self._by_type: Dict[str, Tuple[Tuple[int, int, Optional[frozenset]], ...]] = {
+            block_type: tuple(
+                [rule.compile() for rule in self.rules if rule.block_types and block_type in rule.block_types]
+                + wildcard
+            )
+            for block_type in block_types
+        }
+        self._wildcard = tuple(wildcard)
+
+    def match(self, block: _NotionObject) -> List[_NotionObject]:
+        """
+        one copy of the block per distinct unit found in it, with "unit" set to the text of the matching run;
+        an empty list when nothing matches. whitespace-only runs never count as units.
+        """
+        candidates = self._by_type.get(block["type"], self._wildcard)
+        if not candidates:
+            return []
+        units: List[_NotionObject] = []
+        seen = set()
+        for run in rich_text_runs(block):
+            annotations = _annotation_mask(run)
+            for mask, value, colors in candidates:
+                if annotations & mask == value and (colors is None or run.color in colors):
+                    text = run.plain_text
+                    if text.strip() and text not in seen:
+                        seen.add(text)
+                        unit_block = block.copy()
+                        unit_block["unit"] = text
+                        units.append(unit_block)
+                    break
+        return units
+
+    def extract(self, block_children: Iterable[_NotionObject]) -> List[_NotionObject]:
+        """every unit occurrence in block_children, in order"""
+        units: List[_NotionObject] = []
+        for block in block_children:
+            units.extend(self.match(block))
+        return units
@@ -0,0 +1,185 @@
+import asyncio
+import functools
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple, Union
+import requests
+from requests.adapters import HTTPAdapter
+
+_Timeout = Union[float, Tuple[float, float]]
+
+try:
+    # orjson parses the large block listings several times faster; it is optional, json is the fallback
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+def json_loads(response: requests.Response) -> Any:
+    """decode a json response body straight from its bytes, skipping requests' encoding detection"""
+    return _loads(response.content)
+
+
+class HTTPTransport:
+    """
+    Pooled keep-alive transport; one instance owns one requests.Session, so connections (and the TCP+TLS handshake)
+    are reused across every call made through it. Headers are per instance, never shared between transports.
+    """
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, pool_size: int = 10, timeout: _Timeout = (5, 30)):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncHTTPTransport:
+    """
+    asyncio front of an HTTPTransport: blocking requests run on a thread pool sized to the connection pool, so up to
+    pool_size requests are in flight at once while sharing the same keep-alive connections.
+    """
+
+    def __init__(self, transport: HTTPTransport, max_in_flight: Optional[int] = None):
+        self.transport = transport
+        self.max_in_flight = max_in_flight or transport.pool_size
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="http")
+
+    async def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.transport.request, method, url, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at `rate` tokens per second up to `burst`. Callers reserve a token and wait out
+    the returned delay, so sync (time.sleep) and async (asyncio.sleep) callers draw from the same budget.
+    """
+
+    def __init__(self, rate: float = 3.0, burst: int = 10):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1.")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token (possibly borrowing from the future) and return how long the caller must wait before use."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available right now; never borrows from the future."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens < 1 or now < self._blocked_until:
+                return False
+            self._tokens -= 1
+            return True
+
+    def pause(self, seconds: float):
+        """Hold every caller for `seconds`, e.g. when the server answers 429 with a Retry-After."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff for rate-limited and transient failures; a Retry-After header, when present, is used
+    as the lower bound of the delay.
+    """
+
+    RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+    RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, attempt: int, response: Optional[requests.Response], idempotent: bool = True) -> bool:
+        """
+        response is None when the attempt raised one of RETRY_EXCEPTIONS. Non-idempotent requests (page creation,
+        appends) are only retried on 429, which the server rejects before doing any work.
+        """
+        if attempt >= self.max_retries:
+            return False
+        if not idempotent:
+            return response is not None and response.status_code == 429
+        return response is None or response.status_code in self.RETRY_STATUS_CODES
+
+    def delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        # full jitter: uniform over [0, base * 2**attempt], capped
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        retry_after = self.retry_after(response) if response is not None else None
+        if retry_after is not None:
+            return retry_after + backoff * 0.1
+        return backoff
+
+    @staticmethod
+    def retry_after(response: requests.Response) -> Optional[float]:
+        """Parse Retry-After given either as delta-seconds or as an HTTP date."""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from settings import _NotionID, _NotionObject
+
+
+class UnitIndexError(Exception):
+    """Raised when the local unit index cannot answer consistently, e.g. duplicated titles."""
+
+    pass
+
+
+class UnitIndex:
+    """
+    Local title -> page id index of the unit databases, so membership checks cost no request.
+    A database is loaded with one paginated scan, later refreshes only query pages whose last_edited_time is past the
+    stored watermark, and the whole index is persisted to a json file between runs.
+    Database queries never return archived or deleted pages, so an incremental refresh cannot see a page go: a full
+    scan is redone every FULL_SCAN_INTERVAL, and a page found gone in between is dropped with remove().
+    """
+
+    # Notion rounds last_edited_time to the minute, so the watermark is moved back to not miss edits during a scan
+    WATERMARK_SLACK = timedelta(minutes=1)
+    FULL_SCAN_INTERVAL = timedelta(days=7)
+
+    def __init__(self, path: str = ".unit_index.json"):
+        self.path = path
+        self._lock = threading.Lock()
+        # database_id -> {"watermark": iso str, "titles": {title: [page_id]}, "pages": {page_id: title}}
+        self._databases: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            self._databases = json.load(f)
+
+    def save(self):
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._databases, f)
+            os.replace(tmp_path, self.path)
+
+    def refresh(self, notion_api_call, database_id: _NotionID, full: bool = False) -> int:
+        """
+        sync the index of one database with Notion; a full scan on first use, when asked, or once the last one is
+        FULL_SCAN_INTERVAL old, incremental otherwise. return the number of pages read.
+        """
+        database_id = database_id.replace("-", "")
+        scan_started = datetime.now(timezone.utc)
+        database = self._databases.get(database_id)
+        filter = None
+        full = full or database is None or self._full_scan_due(database, scan_started)
+        if full:
+            database = {"watermark": None, "full_scan": None, "titles": {}, "pages": {}}
+        elif database["watermark"]:
+            filter = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": database["watermark"]}}
+        pages = notion_api_call.query_database(database_id, filter, page_size=100)
+        with self._lock:
+            for page in pages:
+                self._put(database, page["id"], self.page_title(page), archived=page.get("archived", False))
+            database["watermark"] = (scan_started - self.WATERMARK_SLACK).isoformat()
+            if full:
+                database["full_scan"] = scan_started.isoformat()
+            self._databases[database_id] = database
+        return len(pages)
+
+    def _full_scan_due(self, database: Dict, now: datetime) -> bool:
+        # no full_scan: the entry was only filled by add(), or saved before full scans were tracked
+        full_scan = database.get("full_scan")
+        return full_scan is None or now - datetime.fromisoformat(full_scan) >= self.FULL_SCAN_INTERVAL
+
+    def add(self, database_id: _NotionID, page: _NotionObject):
+        """record a page we have just created, so later lookups in the same run see it"""
+        with self._lock:
+            database = self._databases.setdefault(
+                database_id.replace("-", ""), {"watermark": None, "titles": {}, "pages": {}}
+            )
+            self._put(database, page["id"], self.page_title(page))
+
+    def remove(self, page_id: _NotionID) -> bool:
+        """forget a page found archived or deleted, whatever database it is in; return whether it was indexed"""
+        page_id = page_id.replace("-", "")
+        with self._lock:
+            for database in self._databases.values():
+                for indexed_id in database["pages"]:
+                    if indexed_id.replace("-", "") == page_id:
+                        self._put(database, indexed_id, "", archived=True)
+                        return True
+        return False
+
+    def lookup(self, database_id: _NotionID, title: str) -> Optional[_NotionID]:
+        """
+        return the page id for the given title in the database, None when absent;
+        raise UnitIndexError when more than one page carries the title.
+        """
+        database = self._databases.get(database_id.replace("-", ""))
+        if database is None:
+            raise UnitIndexError(f"Database {database_id} is not indexed; call refresh() first.")
+        page_ids: List[str] = database["titles"].get(title, [])
+        if len(page_ids) > 1:
+            raise UnitIndexError(f"More than one page found for the unit {title}.")
+        return page_ids[0] if page_ids else None
+
+    def is_indexed(self, database_id: _NotionID) -> bool:
+        return database_id.replace("-", "") in self._databases
+
+    def _put(self, database: Dict, page_id: str, title: str, archived: bool = False):
+        """insert or move a page under its (possibly new) title; caller holds the lock"""
+        old_title = database["pages"].pop(page_id, None)
+        if old_title is not None:
+            page_ids = database["titles"].get(old_title, [])
+            if page_id in page_ids:
+                page_ids.remove(page_id)
+            if not page_ids:
+                database["titles"].pop(old_title, None)
+        if archived:
+            return
+        database["pages"][page_id] = title
+        database["titles"].setdefault(title, []).append(page_id)
+
+    @staticmethod
+    def page_title(page: _NotionObject) -> str:
+        for prop in page["properties"].values():
+            if prop["type"] == "title":
+                return "".join(run["plain_text"] for run in prop["title"])
+        return ""
@@ -1,50 +1,435 @@
 import os
 import json
-from notion_api_utils import CEPagesManager
-from wm_api_utils import MerriamWebsterAPI, MWAPIError
-from settings import DEBUG, _NotionID, _NotionObject, _NotionResponse
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from notion_api_utils import CEPagesManager, NotionAPIError
+from index_utils import UnitIndex, UnitIndexError
+from store_utils import SyncStateStore, RunJournal, OccurrenceIndex, Occurrence, WriteQueueStore, PendingWrite
+from pipeline_utils import Pipeline, Stage
+from wm_api_utils import MerriamWebsterAPI, MWAPIError, WordPrefetcher
+from cache_utils import DiskCache
+from metrics_utils import HTTPMetrics
+from http_utils import TokenBucket
+from http_utils import HTTPTransport
+from cassette_utils import Cassette, RecordingTransport, ReplayTransport
+from settings import DEBUG, METRICS_PATH, TRACE_PATH
+from settings import CASSETTE_MODE, CASSETTE_PATH, CASSETTE_LATENCY, CASSETTE_LATENCY_SCALE
+from settings import KEEP_RAW_BLOCKS, MW_RATE_LIMIT, MW_RATE_BURST, SHARD_PROCESSES, UNFOLD_MAX_DEPTH, UNFOLD_MAX_BLOCKS
+from settings import _NotionID, _NotionObject, _NotionResponse
+from record_utils import BlockRecord, rich_text_runs
+import block_utils
+from shard_utils import ShardedUnfolder
+from traversal_utils import TraversalPolicy
+from trace_utils import TRACER, StackSampler, span, traced
+from write_utils import WriteBehind
 
 
 class SyntheticOperation:
     MAINDATABASE_ID = "aaa18f4dfc56495e835e0289cbe25f3b"
     WORDDATABASE_ID = "a9d64a44ea8844088612055786f85954"
     EXPRDATABASE_ID = "3670f8bab263462a8e60c6ae8ae88dd8"
+    # items waiting between two pipeline stages
+    PIPELINE_QUEUE_SIZE = 100
+    # concurrent deliveries of queued writes
+    WRITE_WORKERS = 4
+    # concurrent dictionary lookups of new words
+    PREFETCH_WORKERS = 4
 
     def __init__(self):
-        self.CEpages = CEPagesManager(os.environ["NOTION_KEY"])
-        self.WMapi = MerriamWebsterAPI(os.environ["MERRIAM_WEBSTER_KEY"])
+        self.unit_index = UnitIndex()
+        self.sync_store = SyncStateStore(".sync_state.sqlite3")
+        # checkpoints of the current (or last interrupted) run, see refresh_units_database_with_contexts(resume=True)
+        self.journal = RunJournal(".run_journal.sqlite3")
+        # every occurrence of every unit, kept up to date by each run; see search_units.py
+        self.occurrence_index = OccurrenceIndex(".occurrences.sqlite3")
+        self.metrics = HTTPMetrics() if METRICS_PATH else None
+        self.CEpages = CEPagesManager(
+            os.environ["NOTION_KEY"],
+            unit_index=self.unit_index,
+            sync_store=self.sync_store,
+            metrics=self.metrics,
+            transport=self._transport(),
+            keep_raw_blocks=KEEP_RAW_BLOCKS,
+            traversal_policy=TraversalPolicy(
+                max_depth=UNFOLD_MAX_DEPTH or None, max_blocks=UNFOLD_MAX_BLOCKS or None
+            ),
+        )
+        self.WMapi = MerriamWebsterAPI(
+            os.environ["MERRIAM_WEBSTER_KEY"],
+            cache=DiskCache(".mw_cache.sqlite3"),
+            metrics=self.metrics,
+            transport=self._transport(),
+            rate_limiter=TokenBucket(rate=MW_RATE_LIMIT, burst=MW_RATE_BURST),
+        )
+        # lookups of the new words of the current run, started as soon as a word is first seen
+        self.prefetcher: Optional[WordPrefetcher] = None
+        # worker processes traversing the contexts of the current run, when it is sharded
+        self.shards: Optional[ShardedUnfolder] = None
         self.debug = DEBUG
+        # page creations, context appends and extraction time updates are queued here and sent in the background
+        self.writes = WriteBehind(
+            WriteQueueStore(".write_queue.sqlite3", self.CEpages.CHILDREN_PER_REQUEST),
+            self.CEpages.notion_api_call,
+            workers=self.WRITE_WORKERS,
+            on_done={"create": self._page_created, "update": self._page_updated},
+            on_send={"update": self._stamp_extraction_time},
+            on_failed={"append": self._append_failed},
+            debug=self.debug,
+        )
+        # (unit_name, unit_blocks, error) for every batch that could not be resolved or written in the last run
+        self.batch_errors = []
+
+    def _transport(self) -> Optional[HTTPTransport]:
+        """transport for an API client according to CASSETTE_MODE; None lets the client build its pooled default"""
+        if CASSETTE_MODE is None:
+            return None
+        if not hasattr(self, "cassette"):
+            self.cassette = Cassette(CASSETTE_PATH)
+        if CASSETTE_MODE == "record":
+            return RecordingTransport(self.cassette)
+        if CASSETTE_MODE == "replay":
+            return ReplayTransport(self.cassette, latency_scale=CASSETTE_LATENCY_SCALE, latency=CASSETTE_LATENCY)
+        raise ValueError(f"Unknown CASSETTE_MODE {CASSETTE_MODE!r}; expected 'record' or 'replay'.")
 
     def refresh_units_database_with_contexts(
         self,
         word_database_id: _NotionID = WORDDATABASE_ID,
         expression_database_id: _NotionID = EXPRDATABASE_ID,
         main_data_base_id: _NotionID = MAINDATABASE_ID,
+        resume: bool = False,
+        processes: int = SHARD_PROCESSES,
+        context_ids: Optional[Iterable[_NotionID]] = None,
+        clear_cache: bool = True,
     ):
         """
         main entry point for now, refresh the designated database with the units extracted from the designated contexts
+        progress is checkpointed in the run journal as it goes; with resume, a run that was interrupted (or had failed
+        batches) continues from its last checkpoint instead of starting over, so no context link is appended twice.
+        with processes > 1 the contexts are traversed by that many worker processes sharing one request budget.
+        context_ids restricts the run to those contexts; clear_cache=False keeps the reads cached by earlier runs
+        (a caller doing so invalidates what changed, see WatchDaemon).
+        with TRACE_PATH set (or TRACER enabled by the caller, see --profile) the stages of the run are traced; spans
+        of shard worker processes are not collected.
         """
-        contexts = self.CEpages.get_contexts_from_database(main_data_base_id)
-        block_children = []
-        units_blocks = []
-        child_pages_to_sync = []
-        for context in contexts:
-            block_children.extend(self.CEpages.unfold_block_and_mark_sync(context["id"])[0])
-            child_pages_to_sync.extend(self.CEpages.unfold_block_and_mark_sync(context["id"])[1])
-        units_blocks = self.CEpages.extract_units(block_children)
-        for unit_block in units_blocks:
-            self.append_or_update_unit_in_database(word_database_id, expression_database_id, unit_block)
+        if TRACE_PATH:
+            TRACER.enable()
+        if not resume:
+            self.journal.clear()
+        elif not self.journal.is_empty():
+            print("Resuming the last run from its checkpoints.")
+        if clear_cache:
+            # scope the read cache to this run
+            self.CEpages.notion_api_call.clear_cache()
+        # one paginated scan per unit database (incremental after the first run) replaces a query per unit
+        for database_id in (word_database_id, expression_database_id):
+            with span("UnitIndex.refresh", database_id=database_id):
+                self.unit_index.refresh(self.CEpages.notion_api_call, database_id)
+        notion = self.CEpages.notion_api_call
+        run_limiter = notion.rate_limiter
+        # recording and replay go through this process' transports, so cassette runs are never sharded
+        if processes > 1 and CASSETTE_MODE is None:
+            self.shards = ShardedUnfolder(
+                os.environ["NOTION_KEY"],
+                notion.BASE_URL,
+                processes,
+                run_limiter.rate,
+                run_limiter.burst,
+                sync_store_path=self.sync_store.path,
+                max_workers=self.CEpages.max_workers,
+                keep_raw_blocks=notion.keep_raw_blocks,
+                unit_rules=self.CEpages.unit_matcher.rules,
+                traversal_policy=self.CEpages.traversal_policy,
+            )
+            # this process' resolves and appends draw from the global budget as well
+            notion.rate_limiter = self.shards.rate_limiter
+        try:
+            with span("SyntheticOperation._refresh_units"):
+                self._refresh_units(word_database_id, expression_database_id, main_data_base_id, context_ids)
+        finally:
+            if self.shards is not None:
+                notion.rate_limiter = run_limiter
+                self.shards.close()
+                self.shards = None
+            self.unit_index.save()
+            if self.metrics is not None:
+                self.metrics.write(METRICS_PATH)
+            if TRACE_PATH:
+                TRACER.write_chrome_trace(TRACE_PATH)
+
+    def _refresh_units(
+        self,
+        word_database_id: _NotionID,
+        expression_database_id: _NotionID,
+        main_data_base_id: _NotionID,
+        context_ids: Optional[Iterable[_NotionID]] = None,
+    ):
+        """
+        streaming pipeline: fetch units -> group per unit -> resolve unit pages -> append contexts.
+        the unit rules run on each listing as it is fetched, so only unit blocks ever enter the pipeline; stages are
+        connected by bounded queues, and a unit's contexts are queued in batches of up to CHILDREN_PER_REQUEST, as
+        soon as a batch is full or at the end of the run.
+        writes go through the write-behind queue (self.writes): its workers send them while the pipeline keeps
+        reading, and writes left over by an interrupted run are sent first. The run waits for the queue to drain
+        before the extraction times are updated, and again at the end; an interrupted run does not wait.
+        """
+        self.writes.start()
+        try:
+            self._run_pipeline(word_database_id, expression_database_id, main_data_base_id, context_ids)
+        except BaseException:
+            # interrupted or failed: the writes not sent yet stay in the durable queue, for the next run to send first
+            self.writes.stop(flush=False)
+            raise
+        self.writes.stop()
+
+    def _run_pipeline(
+        self,
+        word_database_id: _NotionID,
+        expression_database_id: _NotionID,
+        main_data_base_id: _NotionID,
+        context_ids: Optional[Iterable[_NotionID]],
+    ):
+        clean_id = self.CEpages._clean_id
+        if context_ids is None:
+            context_ids = [context["id"] for context in self.CEpages.get_contexts_from_database(main_data_base_id)]
+        context_ids = [clean_id(context_id) for context_id in context_ids]
+        seen_units = set()
+        # checkpoints left by an interrupted run; both are empty on a fresh run
+        traversed_contexts = self.journal.traversed_contexts()
+        appended_occurrences = self.journal.appended_occurrences()
+
+        def traverse(context_ids):
+            """(context_id, unit blocks, child pages to sync) per context, in-process or from the shard workers"""
+            if self.shards is not None:
+                yield from self.shards.iter_contexts(context_ids)
+                return
+            for context_id in context_ids:
+                # streamed: the list of pages to sync is complete once the unit blocks are exhausted
+                child_pages_to_sync = []
+                unit_blocks = self.CEpages.iter_units_and_mark_sync(context_id, child_pages_to_sync)
+                yield context_id, unit_blocks, child_pages_to_sync
+
+        def fetch_units():
+            for context_id in context_ids:
+                if context_id in traversed_contexts:
+                    # traversed before the interruption: only what was not appended yet is left, no fetch needed
+                    for block_id, unit, block_type, parent_page_id in self.journal.unappended_occurrences(context_id):
+                        yield BlockRecord(block_id, block_type, parent_page_id=parent_page_id, unit=unit)
+            to_traverse = [context_id for context_id in context_ids if context_id not in traversed_contexts]
+            for context_id, unit_blocks, child_pages_to_sync in traverse(to_traverse):
+                # spans the unfolding of the context (its fetches run on the unfolder's threads) and the puts
+                # into the group queue, which block while the pipeline is backed up
+                with span("fetch_units.context", context_id=context_id):
+                    occurrences = []
+                    for unit_block in unit_blocks:
+                        block_id = clean_id(unit_block["id"])
+                        occurrences.append(self._occurrence(context_id, unit_block))
+                        if (block_id, unit_block["unit"]) in appended_occurrences:
+                            continue
+                        self.journal.add_occurrence(
+                            context_id, block_id, unit_block["unit"], unit_block["type"], unit_block["parent_page_id"]
+                        )
+                        yield unit_block
+                    traversed_pages = [clean_id(page["id"]) for page in child_pages_to_sync]
+                    # the context page and its out-of-sync child pages were read in full: their occurrences are current
+                    self.occurrence_index.replace_pages([context_id] + traversed_pages, occurrences)
+                    self.journal.mark_traversed(context_id, traversed_pages)
+
+        # occurrences are grouped per unit, so each unit is resolved once and its contexts go out in batches
+        pending_by_unit: Dict[str, List[_NotionObject]] = {}
+        batch_size = self.CEpages.CHILDREN_PER_REQUEST
+
+        def group(unit_block):
+            unit_name = unit_block["unit"]
+            if unit_name not in seen_units:
+                seen_units.add(unit_name)
+                # the dictionary lookup of a new word runs while its occurrences are still being collected
+                if self._is_new_word(unit_name, word_database_id):
+                    self.prefetcher.prefetch(unit_name)
+            unit_blocks = pending_by_unit.setdefault(unit_name, [])
+            unit_blocks.append(unit_block)
+            if len(unit_blocks) == batch_size:
+                return [pending_by_unit.pop(unit_block["unit"])]
+
+        def flush_groups():
+            batches = list(pending_by_unit.values())
+            pending_by_unit.clear()
+            return batches
+
+        def resolve(unit_blocks):
+            try:
+                resolved = self.resolve_unit_page(word_database_id, expression_database_id, unit_blocks[0])
+            except NotionAPIError as e:
+                self._report_batch_error(unit_blocks, e)
+                return None
+            if resolved is None:
+                # the word has no dictionary entry: its occurrences are done with, not failed
+                self.journal.mark_appended((clean_id(block["id"]), block["unit"]) for block in unit_blocks)
+                return None
+            return [(resolved[2], unit_blocks)]
+
+        def append(resolved):
+            unit_page_id, unit_blocks = resolved
+            children = [
+                self.CEpages._context_paragraph(block["unit"], self.CEpages.url_for_extracted_unit(block))
+                for block in unit_blocks
+            ]
+            # kept with the write, to report the occurrences should it fail
+            occurrences = [[clean_id(block["id"]), block["unit"], block["parent_page_id"]] for block in unit_blocks]
+            self.writes.append_block_children(unit_page_id, children, meta={"occurrences": occurrences})
+            # the queue is durable: from here on, delivering the contexts is up to it (a failed delivery takes the
+            # mark back, see _report_write_failures)
+            self.journal.mark_appended((clean_id(block["id"]), block["unit"]) for block in unit_blocks)
+
+        self.batch_errors = []
+        pipeline = Pipeline(
+            fetch_units(),
+            [
+                Stage("group", group, queue_size=self.PIPELINE_QUEUE_SIZE, flush=flush_groups),
+                # a single resolver serializes page creation, so a new unit seen twice is only created once
+                Stage("resolve", resolve, queue_size=self.PIPELINE_QUEUE_SIZE),
+                # appends only go into the write queue, serialized on its lock: one worker keeps them in order
+                Stage("append", append, queue_size=self.PIPELINE_QUEUE_SIZE),
+            ],
+        )
+        self.prefetcher = WordPrefetcher(self.WMapi, max_workers=self.PREFETCH_WORKERS)
+        try:
+            pipeline.run()
+        finally:
+            self.prefetcher.close()
+            self.prefetcher = None
+        with span("flush_writes"):
+            self.writes.flush()
+        self._report_write_failures()
         # the updation should be the last step to ensure that all in-state sync info are accurate
         # when there is an interruption at this stage, the only consequence is that the already synced pages will be
         # synced again next time
-        for child_page in child_pages_to_sync:
-            self.CEpages.update_extraction_time(child_page)
+        # pages with a failed batch are left out of sync, so their contexts are retried next run; they are read from
+        # the journal, which also knows the failures of the run a resumed run continues
+        failed_pages = {clean_id(page_id) for page_id in self.journal.unappended_pages()}
+        # pending pages are checkpointed too: each one leaves the journal once its extraction time is written
+        with span("update_extraction_times"):
+            for page_id in self.journal.pending_pages():
+                if page_id not in failed_pages:
+                    # the time is taken when the update is sent, see _stamp_extraction_time
+                    self.writes.update_page(page_id, {}, meta={"extraction_time": True})
+                    self.journal.clear_pending_page(page_id)
+            self.writes.flush()
+        self._report_write_failures()
+        if failed_pages:
+            print(
+                f"{len(self.batch_errors)} unit batches failed; {len(failed_pages)} pages will be retried next run "
+                "(run with --resume to retry only what failed)."
+            )
+        else:
+            self.journal.clear()
+        if self.debug:
+            print(f"pipeline: {pipeline.stats}")
+            print(f"read cache: {self.CEpages.notion_api_call.cache_stats()}")
+            # traversals of shard worker processes are counted in those processes
+            print(f"traversal: {self.CEpages.traversal_stats.snapshot()}")
+
+    def _occurrence(self, context_id: _NotionID, unit_block: _NotionObject) -> Occurrence:
+        clean_id = self.CEpages._clean_id
+        return Occurrence(
+            unit_block["unit"],
+            clean_id(unit_block["id"]),
+            clean_id(unit_block["parent_page_id"]),
+            context_id,
+            self.CEpages.url_for_extracted_unit(unit_block),
+            "".join(run.plain_text for run in rich_text_runs(unit_block)),
+        )
+
+    def _is_new_word(self, unit_name: str, word_database_id: _NotionID) -> bool:
+        """a word the indexed word database has no page for; unknown (not indexed) counts as not new"""
+        if " " in unit_name or not self.unit_index.is_indexed(word_database_id):
+            return False
+        try:
+            return self.unit_index.lookup(word_database_id, unit_name) is None
+        except UnitIndexError:
+            return False
+
+    def _page_created(self, meta: Dict[str, Any], page: _NotionObject):
+        self.unit_index.add(meta["database_id"], page)
+
+    def _stamp_extraction_time(self, meta: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        set the extraction time of an update as it is sent: taken when it is queued, it could be minutes older than
+        the edit the update itself makes, and the page would look edited after its extraction
+        """
+        if not meta.get("extraction_time"):
+            return payload
+        extracted_time, properties = self.CEpages.extraction_time_properties()
+        meta["extracted_time"] = extracted_time
+        return {**payload, "properties": {**payload["properties"], **properties}}
+
+    def _page_updated(self, meta: Dict[str, Any], page: _NotionObject):
+        if "extracted_time" in meta:
+            extracted_time = meta["extracted_time"]
+            # the update edits the page; should that edit fall in the next minute, the watermark follows it
+            edited_time = page.get("last_edited_time")
+            if edited_time and not self.CEpages._date_time_compare(extracted_time, edited_time):
+                extracted_time = edited_time
+            self.sync_store.mark_extracted(self.CEpages._clean_id(page["id"]), extracted_time)
+
+    def _append_failed(self, write: PendingWrite, error: Exception):
+        """
+        a unit page deleted or archived since it was indexed refuses appends (404, or 400 once archived): drop it from
+        the unit index, so the contexts of its unit, sent again by a later run, go to a new page
+        """
+        if getattr(error, "status_code", None) not in (400, 404) or write.target.startswith("pending-"):
+            return
+        try:
+            page = self.CEpages.notion_api_call.get_page(write.target)
+        except NotionAPIError as e:
+            gone = e.status_code == 404
+        else:
+            gone = page.get("archived", False) or page.get("in_trash", False)
+        if gone and self.unit_index.remove(write.target):
+            print(f"Unit page {write.target} is gone; it is dropped from the unit index.")
+
+    def _report_write_failures(self):
+        """
+        turn the writes the queue gave up on into batch errors, and mark their occurrences unappended in the journal,
+        so their pages are kept out of sync and their contexts are sent again by a resumed (or the next) run
+        """
+        for write, error in self.writes.failures():
+            occurrences = write.meta.get("occurrences")
+            if occurrences:
+                self.journal.mark_unappended((block_id, unit) for block_id, unit, _ in occurrences)
+                unit_blocks = [
+                    BlockRecord(block_id, "", parent_page_id=parent_page_id, unit=unit)
+                    for block_id, unit, parent_page_id in occurrences
+                ]
+                self._report_batch_error(unit_blocks, NotionAPIError(error))
+            else:
+                print(f"Failed to {write.kind} {write.target}: {error}")
+        self.writes.clear_failures()
+
+    def _report_batch_error(self, unit_blocks: List[_NotionObject], error: Exception):
+        unit_name = unit_blocks[0]["unit"]
+        print(f"Failed to write {len(unit_blocks)} contexts for {unit_name}: {error}")
+        self.batch_errors.append((unit_name, unit_blocks, error))
 
     def append_or_update_unit_in_database(
         self, word_database_id: _NotionID, expression_database_id: _NotionID, unit_block: _NotionObject
-    ) -> _NotionObject:
+    ):
         """
         append units to the database with the given database_id
+        the writes are queued: they are sent once self.writes is started, and are done after self.writes.flush()
+        """
+        resolved = self.resolve_unit_page(word_database_id, expression_database_id, unit_block)
+        if resolved is None:
+            return None
+        unit_name, unit_url, unit_page_id = resolved
+        self.writes.append_block_children(unit_page_id, [self.CEpages._context_paragraph(unit_name, unit_url)])
+
+    @traced()
+    def resolve_unit_page(
+        self, word_database_id: _NotionID, expression_database_id: _NotionID, unit_block: _NotionObject
+    ) -> Optional[Tuple[str, str, _NotionID]]:
+        """
+        return (unit_name, unit_url, unit_page_id) for a unit block, queueing the creation of the unit page when it does
+        not exist yet (unit_page_id is then the placeholder of the queued page); None when the word cannot be looked up.
         """
         if_word = True
         database_id = word_database_id
@@ -53,192 +438,67 @@ class SyntheticOperation:
         if " " in unit_name:
             if_word = False
             database_id = expression_database_id
-        unit_page_id = self.CEpages.if_unit_in_database(unit_name, database_id)
+        # a page queued for creation is not in the database yet, but must not be queued twice
+        unit_page_id = self.writes.page_for(database_id, unit_name)
+        unit_page_id = unit_page_id or self.CEpages.if_unit_in_database(unit_name, database_id)
         unit_url = self.CEpages.url_for_extracted_unit(unit_block)
         # check if the unit is already in the database
         if not unit_page_id:
             simple_dicts = []
             if if_word:
                 try:
-                    simple_dicts = self.WMapi.response_to_CE(self.WMapi.get_word_mw_response(unit_name))
+                    lookup = self.prefetcher.get_word_CE if self.prefetcher is not None else self.WMapi.get_word_CE
+                    simple_dicts = lookup(unit_name)
                     # assuming the first headword is the one we want
                 except MWAPIError:
                     print(f"Error fetching data for {unit_name}, skipping...")
                     return None
-            unit_page_id = self.page_construct(unit_name, simple_dicts, database_id)["id"]
-
-        self.CEpages.append_new_context_to_unit(unit_name, unit_url, unit_page_id)
-
-    def page_construct(self, unit_name: str, simple_dicts: list[dict], database_id: _NotionID) -> _NotionObject:
-        """
-        create a new unit page in the given database
-        """
-
-        def _properties_construct(title_name: str, pronuciations: list[str] = None):
-            properties = {
-                "title": {"title": [{"text": {"content": title_name}}]},
-            }
-            if pronuciations:
-                properties["Pronunciation"] = {"rich_text": [{"text": {"content": f"\{pr}\ "}} for pr in pronuciations]}
-            return properties
-
-        def _heading_2_obj(text="", link=None, rich_text_runs=None):
-            obj = {
-                "object": "block",
-                "type": "heading_2",
-                "heading_2": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": text,
-                                "link": link,
-                            },
-                        }
-                    ],
-                    "color": "default",
-                    "is_toggleable": False,
-                },
-            }
-            if rich_text_runs:
-                obj["heading_2"]["rich_text"] = rich_text_runs
-            return obj
-
-        def _heading_3_obj(text="", link=None, rich_text_runs=None):
-            obj = {
-                "object": "block",
-                "type": "heading_3",
-                "heading_3": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": text,
-                                "link": link,
-                            },
-                        }
-                    ],
-                    "color": "default",
-                    "is_toggleable": False,
-                },
-            }
-            if rich_text_runs:
-                obj["heading_3"]["rich_text"] = rich_text_runs
-            return obj
-
-        def _bulleted_list_item_obj(text, link=None):
-            obj = {
-                "object": "block",
-                "type": "bulleted_list_item",
-                "bulleted_list_item": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": text,
-                                "link": link,
-                            },
-                        },
-                    ],
-                    "color": "default",
-                },
-            }
-
-            return obj
-
-        def _para_obj(text, link=None, color="default", italic=False):
-            obj = {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": text,
-                                "link": link,
-                            },
-                            "annotations": {
-                                "italic": italic,
-                            },
-                        },
-                    ],
-                    "color": color,
-                },
-            }
-            return obj
-
-        def _embed_obj(url):
-            obj = {
-                "object": "block",
-                "type": "embed",
-                "embed": {
-                    "url": url,
-                },
-            }
-            return obj
-
-        def _divider_obj():
-            obj = {
-                "object": "block",
-                "type": "divider",
-                "divider": {},
-            }
-            return obj
-
-        def _rich_context_run(**args):
-            text = args.get("text", "")
-            link = args.get("link", None)
-            anno = args.get("anno", {})
-            rich_text_obj = {
-                "type": "text",
-                "text": {
-                    "content": text,
-                    "link": link,
-                },
-                "annotations": {
-                    "bold": False,
-                    "italic": False,
-                    "strikethrough": False,
-                    "underline": False,
-                    "code": False,
-                    "color": "default",
-                },
-            }
-            if anno:
-                rich_text_obj["annotations"].update(anno)
-            return rich_text_obj
-
-        children = []
-        if not simple_dicts:
-            properties = _properties_construct(unit_name)
-            children.append(_heading_2_obj("Contexts"))
-            return self.CEpages.notion_api_call.create_page(
-                database_id=database_id, properties=properties, children=children
-            )
-        properties = _properties_construct(
-            title_name=simple_dicts[0]["show_word"], pronuciations=[pr["mw"] for pr in simple_dicts[0]["prs"]]
-        )
-        for idx, entry in enumerate(simple_dicts):
-            hw_run = _rich_context_run(text=str(idx + 1) + ". " + entry["hw"])
-            fl_run = _rich_context_run(text=" " + entry["fl"], anno={"color": "gray", "italic": True})
-            children.append(_heading_3_obj(rich_text_runs=[hw_run, fl_run]))
-            for pr in entry["prs"]:
-                if pr["mw"]:
-                    children.append(_para_obj(pr["mw"]))
-                if pr["sound"]:
-                    children.append(_embed_obj(pr["sound"]))
-            defs_objs_list = [_bulleted_list_item_obj(defi) for defi in entry["defs"]]
-            children.extend(defs_objs_list)
-            children.append(_divider_obj())
-        children.append(_heading_2_obj("Context"))
-        with open(".json_view.json", "w") as f:
-            json.dump(children, f, indent=4)
-        return self.CEpages.notion_api_call.create_page(
-            database_id=database_id, properties=properties, children=children
-        )
+            # the unit index learns about the page once it is created, see _page_created
+            unit_page_id = self.page_construct(unit_name, simple_dicts, database_id)
+
+        return unit_name, unit_url, unit_page_id
+
+    @traced()
+    def page_construct(self, unit_name: str, simple_dicts: list[dict], database_id: _NotionID) -> str:
+        """
+        queue the creation of a new unit page in the given database; return its placeholder id
+        """
+        properties, children = block_utils.unit_page(unit_name, simple_dicts)
+        if self.debug:
+            with open(".json_view.json", "w") as f:
+                json.dump(children, f, indent=4)
+        # children that do not fit in the creation request, contexts queued for the page included, are appended after
+        return self.writes.create_page(database_id, unit_name, properties, children, meta={"database_id": database_id})
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the unit databases with the contexts of the main database.")
+    parser.add_argument("--resume", action="store_true", help="continue the last interrupted run from its checkpoints")
+    parser.add_argument(
+        "--processes", type=int, default=SHARD_PROCESSES, help="traverse contexts in this many worker processes"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="trace the run and sample its CPU profile; print a per-stage breakdown and write .trace.json and "
+        ".profile.folded",
+    )
+    args = parser.parse_args()
     SO = SyntheticOperation()
-    SO.refresh_units_database_with_contexts()
+    if not args.profile:
+        SO.refresh_units_database_with_contexts(resume=args.resume, processes=args.processes)
+    else:
+        TRACER.enable()
+        sampler = StackSampler().start()
+        try:
+            SO.refresh_units_database_with_contexts(resume=args.resume, processes=args.processes)
+        finally:
+            sampler.stop()
+            TRACER.disable()
+            TRACER.write_chrome_trace(TRACE_PATH or ".trace.json")
+            sampler.write_folded(".profile.folded")
+            print(TRACER.format_breakdown())
+            print(f"\n{sampler.samples} samples, {sampler.cpu_s:.2f}s CPU over {sampler.wall_s:.2f}s; most sampled:")
+            for function, samples in sampler.top():
+                print(f"{samples:>7}  {function}")
+            print(f"trace written to {TRACE_PATH or '.trace.json'}, folded stacks to .profile.folded")
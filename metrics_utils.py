@@ -0,0 +1,132 @@
+import bisect
+import threading
+from typing import Dict, Optional, Tuple
+
+# upper bounds in seconds of the latency histogram buckets; the implicit last bucket is +Inf
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _EndpointStats:
+    __slots__ = ("statuses", "retries", "bytes_sent", "bytes_received", "buckets", "latency_sum", "count")
+
+    def __init__(self):
+        self.statuses: Dict[str, int] = {}
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.count = 0
+
+
+class HTTPMetrics:
+    """
+    Per-endpoint request metrics shared by the API clients: request counts by status code, retries, bytes sent and
+    received and a latency histogram. Clients only record when they were given an HTTPMetrics, so an uninstrumented
+    client pays a single `is None` check per request.
+    """
+
+    def __init__(self, namespace: str = "notion_sync"):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        # (client, method, endpoint) -> stats
+        self._endpoints: Dict[Tuple[str, str, str], _EndpointStats] = {}
+
+    def _stats(self, client: str, method: str, endpoint: str) -> _EndpointStats:
+        """caller holds the lock"""
+        key = (client, method, endpoint)
+        stats = self._endpoints.get(key)
+        if stats is None:
+            stats = self._endpoints[key] = _EndpointStats()
+        return stats
+
+    def observe(
+        self,
+        client: str,
+        method: str,
+        endpoint: str,
+        status: Optional[int],
+        latency: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+    ):
+        """record one attempt; status None stands for a connection error or timeout"""
+        status_label = str(status) if status is not None else "error"
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, latency)
+        with self._lock:
+            stats = self._stats(client, method, endpoint)
+            stats.statuses[status_label] = stats.statuses.get(status_label, 0) + 1
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.buckets[bucket] += 1
+            stats.latency_sum += latency
+            stats.count += 1
+
+    def observe_retry(self, client: str, method: str, endpoint: str):
+        with self._lock:
+            self._stats(client, method, endpoint).retries += 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """{"client method endpoint": {...}} with cumulative histogram buckets keyed by upper bound"""
+        with self._lock:
+            snapshot = {}
+            for (client, method, endpoint), stats in sorted(self._endpoints.items()):
+                cumulative, buckets = 0, {}
+                for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), stats.buckets):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                snapshot[f"{client} {method} {endpoint}"] = {
+                    "requests": stats.count,
+                    "statuses": dict(stats.statuses),
+                    "retries": stats.retries,
+                    "bytes_sent": stats.bytes_sent,
+                    "bytes_received": stats.bytes_received,
+                    "latency_sum_s": round(stats.latency_sum, 6),
+                    "latency_avg_s": round(stats.latency_sum / stats.count, 6) if stats.count else 0.0,
+                    "latency_buckets": buckets,
+                }
+            return snapshot
+
+    def exposition(self) -> str:
+        """render all metrics in the Prometheus text exposition format"""
+        ns = self.namespace
+        lines = [
+            f"# HELP {ns}_http_requests_total HTTP requests sent, by response status.",
+            f"# TYPE {ns}_http_requests_total counter",
+        ]
+        with self._lock:
+            items = sorted(self._endpoints.items())
+            for (client, method, endpoint), stats in items:
+                labels = f'client="{client}",method="{method}",endpoint="{endpoint}"'
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'{ns}_http_requests_total{{{labels},status="{status}"}} {count}')
+            for name, attribute, help_text in (
+                ("http_retries_total", "retries", "Requests retried after a 429, 5xx or connection error."),
+                ("http_request_bytes_total", "bytes_sent", "Request body bytes sent."),
+                ("http_response_bytes_total", "bytes_received", "Response body bytes received."),
+            ):
+                lines.append(f"# HELP {ns}_{name} {help_text}")
+                lines.append(f"# TYPE {ns}_{name} counter")
+                for (client, method, endpoint), stats in items:
+                    labels = f'client="{client}",method="{method}",endpoint="{endpoint}"'
+                    lines.append(f"{ns}_{name}{{{labels}}} {getattr(stats, attribute)}")
+            lines.append(f"# HELP {ns}_http_request_duration_seconds Request latency.")
+            lines.append(f"# TYPE {ns}_http_request_duration_seconds histogram")
+            for (client, method, endpoint), stats in items:
+                labels = f'client="{client}",method="{method}",endpoint="{endpoint}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), stats.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{ns}_http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{ns}_http_request_duration_seconds_sum{{{labels}}} {stats.latency_sum}")
+                lines.append(f"{ns}_http_request_duration_seconds_count{{{labels}}} {stats.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            f.write(self.exposition())
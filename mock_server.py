@@ -0,0 +1,442 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+from http_utils import TokenBucket
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _rich_text(text: str, bold: bool = False, italic: bool = False) -> Dict[str, Any]:
+    return {
+        "type": "text",
+        "text": {"content": text, "link": None},
+        "annotations": {
+            "bold": bold,
+            "italic": italic,
+            "strikethrough": False,
+            "underline": False,
+            "code": False,
+            "color": "default",
+        },
+        "plain_text": text,
+        "href": None,
+    }
+
+
+class MockWorkspace:
+    """
+    In-memory Notion workspace: databases, pages and a block tree, with just enough of the API semantics
+    (pagination cursors, filters, last_edited_time bookkeeping) for NotionAPI and CEPagesManager.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.databases: Dict[str, Dict[str, Any]] = {}
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.blocks: Dict[str, Dict[str, Any]] = {}
+        self.children: Dict[str, List[str]] = {}
+        # word -> Merriam-Webster style response
+        self.dictionary: Dict[str, List[Dict[str, Any]]] = {}
+
+    @staticmethod
+    def clean(object_id: str) -> str:
+        return object_id.replace("-", "")
+
+    @staticmethod
+    def new_id() -> str:
+        return str(uuid.uuid4())
+
+    # construction
+    def add_database(self, database_id: str, title_property: str = "Name") -> str:
+        self.databases[self.clean(database_id)] = {"object": "database", "id": database_id, "title": title_property}
+        return database_id
+
+    def add_page(self, parent: Dict[str, str], title: str, properties: Optional[Dict] = None, page_id=None) -> str:
+        page_id = page_id or self.new_id()
+        now = _now_iso()
+        title_property = "title"
+        if "database_id" in parent:
+            title_property = self.databases[self.clean(parent["database_id"])]["title"]
+        page_properties = {title_property: {"id": "title", "type": "title", "title": [_rich_text(title)]}}
+        page_properties["Last extracted time"] = {"id": "let", "type": "date", "date": None}
+        page_properties["Last edited time"] = {"id": "ledt", "type": "last_edited_time", "last_edited_time": now}
+        page_properties.update(properties or {})
+        self.pages[self.clean(page_id)] = {
+            "object": "page",
+            "id": page_id,
+            "archived": False,
+            "parent": parent,
+            "created_time": now,
+            "last_edited_time": now,
+            "properties": page_properties,
+        }
+        self.blocks[self.clean(page_id)] = self._block(page_id, "child_page", {"title": title})
+        self.children.setdefault(self.clean(page_id), [])
+        if "page_id" in parent:
+            self._attach(parent["page_id"], page_id)
+        return page_id
+
+    def add_block(self, parent_id: str, block_type: str, payload: Dict[str, Any]) -> str:
+        block_id = self.new_id()
+        self.blocks[self.clean(block_id)] = self._block(block_id, block_type, payload)
+        self._attach(parent_id, block_id)
+        return block_id
+
+    def _block(self, block_id: str, block_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        now = _now_iso()
+        return {
+            "object": "block",
+            "id": block_id,
+            "type": block_type,
+            "created_time": now,
+            "last_edited_time": now,
+            "created_by": {"object": "user", "id": "mock-user"},
+            "last_edited_by": {"object": "user", "id": "mock-user"},
+            "has_children": False,
+            "archived": False,
+            block_type: payload,
+        }
+
+    def _attach(self, parent_id: str, block_id: str):
+        self.children.setdefault(self.clean(parent_id), []).append(self.clean(block_id))
+        parent_block = self.blocks.get(self.clean(parent_id))
+        if parent_block is not None:
+            parent_block["has_children"] = True
+
+    def touch(self, object_id: str):
+        """bump last_edited_time of a page (and of its child_page block), as Notion does on any edit"""
+        now = _now_iso()
+        page = self.pages.get(self.clean(object_id))
+        if page is not None:
+            page["last_edited_time"] = now
+            page["properties"]["Last edited time"]["last_edited_time"] = now
+        block = self.blocks.get(self.clean(object_id))
+        if block is not None:
+            block["last_edited_time"] = now
+
+    # queries
+    def query(self, database_id: str, filter: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        database_id = self.clean(database_id)
+        results = []
+        for page in self.pages.values():
+            if page["archived"] or self.clean(page["parent"].get("database_id", "")) != database_id:
+                continue
+            if filter is None or self._matches(page, filter):
+                results.append(page)
+        return results
+
+    def _matches(self, page: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+        if "and" in filter:
+            return all(self._matches(page, condition) for condition in filter["and"])
+        if filter.get("timestamp") == "last_edited_time":
+            on_or_after = datetime.fromisoformat(filter["last_edited_time"]["on_or_after"])
+            return datetime.fromisoformat(page["last_edited_time"]) >= on_or_after
+        prop = page["properties"].get(filter.get("property"))
+        if prop is None:
+            return False
+        if "title" in filter:
+            return "".join(run["plain_text"] for run in prop["title"]) == filter["title"]["equals"]
+        if "multi_select" in filter:
+            return any(option["name"] == filter["multi_select"]["contains"] for option in prop["multi_select"])
+        return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MockServer"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def _dispatch(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        parsed = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        mock = self.server
+        route = mock.route_name(method, parsed.path)
+        mock.count(route)
+        if mock.latency:
+            time.sleep(mock.latency * random.uniform(0.5, 1.5) if mock.jitter else mock.latency)
+        # only the Notion side is rate limited, as the dictionary API is metered by daily quota instead
+        if mock.limiter is not None and "/mw/" not in route and not mock.limiter.try_acquire():
+            mock.count("429")
+            return self._send(429, {"object": "error", "code": "rate_limited"}, {"Retry-After": "1"})
+        if route in mock.errors:
+            return self._send(mock.errors[route], {"object": "error", "code": "internal_server_error"})
+        try:
+            status, payload = mock.handle(method, parsed.path, query, body)
+        except KeyError:
+            status, payload = 404, {"object": "error", "code": "object_not_found"}
+        self._send(status, payload)
+
+    def _send(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the Notion and Merriam-Webster endpoints used by NotionAPI and MerriamWebsterAPI.
+    Notion is served under /v1 and the dictionary under /mw/; latency is added to every request and an optional
+    token bucket answers 429 with Retry-After once the configured request rate is exceeded.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        workspace: MockWorkspace,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: bool = True,
+        rate_limit: Optional[float] = None,
+        rate_burst: int = 10,
+        max_page_size: int = 100,
+    ):
+        super().__init__((host, port), _Handler)
+        self.workspace = workspace
+        self.latency = latency
+        self.jitter = jitter
+        self.limiter = TokenBucket(rate_limit, rate_burst) if rate_limit else None
+        self.max_page_size = max_page_size
+        self.requests: Dict[str, int] = {}
+        # route (as named by route_name) -> status answered instead of serving it, to simulate failures
+        self.errors: Dict[str, int] = {}
+        self._count_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def notion_base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    @property
+    def mw_base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/mw/"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, route: str):
+        with self._count_lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def total_requests(self) -> int:
+        with self._count_lock:
+            return sum(count for route, count in self.requests.items() if route != "429")
+
+    def reset_counts(self):
+        with self._count_lock:
+            self.requests.clear()
+
+    @staticmethod
+    def route_name(method: str, path: str) -> str:
+        path = re.sub(r"/[0-9a-f-]{32,36}", "/{id}", path)
+        path = re.sub(r"^/mw/.*", "/mw/{word}", path)
+        return f"{method} {path}"
+
+    # endpoints
+    def handle(self, method: str, path: str, query: Dict[str, str], body: Optional[Dict[str, Any]]):
+        workspace = self.workspace
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        with workspace.lock:
+            if parts[0] == "mw":
+                entry = workspace.dictionary.get(parts[1].lower())
+                return 200, entry if entry is not None else [parts[1] + "s", parts[1][:-1] or parts[1]]
+            parts = parts[1:]
+            match method, parts:
+                case "GET", ["pages", page_id]:
+                    return 200, workspace.pages[workspace.clean(page_id)]
+                case "PATCH", ["pages", page_id]:
+                    page = workspace.pages[workspace.clean(page_id)]
+                    for name, value in body.get("properties", {}).items():
+                        page["properties"].setdefault(name, {"type": next(iter(value))}).update(value)
+                    workspace.touch(page_id)
+                    return 200, page
+                case "POST", ["pages"]:
+                    if len(body.get("children", [])) > 100:
+                        return 400, {"object": "error", "code": "validation_error"}
+                    return 200, self._create_page(body)
+                case "GET", ["blocks", block_id]:
+                    return 200, workspace.blocks[workspace.clean(block_id)]
+                case "GET", ["blocks", block_id, "children"]:
+                    block_ids = workspace.children[workspace.clean(block_id)]
+                    page_size = min(int(query.get("page_size", 100)), self.max_page_size)
+                    return 200, self._paginate([workspace.blocks[i] for i in block_ids], query, page_size)
+                case "PATCH", ["blocks", block_id, "children"]:
+                    if len(body["children"]) > 100:
+                        return 400, {"object": "error", "code": "validation_error"}
+                    parent_id = workspace.clean(block_id)
+                    if parent_id not in workspace.pages and parent_id not in workspace.blocks:
+                        raise KeyError(block_id)
+                    appended = [self._append(block_id, child) for child in body["children"]]
+                    workspace.touch(block_id)
+                    return 200, {"object": "list", "results": appended, "has_more": False, "next_cursor": None}
+                case "GET", ["databases", database_id]:
+                    return 200, workspace.databases[workspace.clean(database_id)]
+                case "POST", ["databases", database_id, "query"]:
+                    results = workspace.query(database_id, (body or {}).get("filter"))
+                    page_size = min(int((body or {}).get("page_size", 100)), self.max_page_size)
+                    return 200, self._paginate(results, body or {}, page_size)
+        return 400, {"object": "error", "code": "invalid_request_url"}
+
+    @staticmethod
+    def _paginate(results: List[Dict[str, Any]], params: Dict[str, Any], page_size: int) -> Dict[str, Any]:
+        start = int(params.get("start_cursor") or 0)
+        end = start + page_size
+        has_more = end < len(results)
+        return {
+            "object": "list",
+            "results": results[start:end],
+            "has_more": has_more,
+            "next_cursor": str(end) if has_more else None,
+        }
+
+    def _create_page(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        workspace = self.workspace
+        title_prop = body["properties"].get("title") or next(iter(body["properties"].values()))
+        title = "".join(run["text"]["content"] for run in title_prop["title"])
+        extra = {name: value for name, value in body["properties"].items() if name != "title"}
+        page_id = workspace.add_page(body["parent"], title, extra)
+        for child in body.get("children", []):
+            self._append(page_id, child)
+        return workspace.pages[workspace.clean(page_id)]
+
+    def _append(self, parent_id: str, child: Dict[str, Any]) -> Dict[str, Any]:
+        workspace = self.workspace
+        payload = dict(child[child["type"]])
+        if "rich_text" in payload:
+            payload["rich_text"] = [
+                {**run, "plain_text": run.get("text", {}).get("content", "")} for run in payload["rich_text"]
+            ]
+        block_id = workspace.add_block(parent_id, child["type"], payload)
+        return workspace.blocks[workspace.clean(block_id)]
+
+
+def generate_workspace(
+    main_database_id: str,
+    word_database_id: str,
+    expression_database_id: str,
+    contexts: int = 5,
+    breadth: int = 10,
+    depth: int = 3,
+    unit_density: float = 0.2,
+    subpage_ratio: float = 0.1,
+    vocabulary: int = 200,
+    known_ratio: float = 0.5,
+    table_ratio: float = 0.0,
+    seed: int = 0,
+) -> MockWorkspace:
+    """
+    build a workspace of `contexts` context pages, each a block tree `breadth` wide and `depth` deep.
+    a share `unit_density` of the bulleted items carries a bold+italic unit drawn from `vocabulary` words or
+    two-word expressions; `known_ratio` of the vocabulary already has a page in the unit databases.
+    a share `table_ratio` of the blocks are small tables, whose rows can never hold a unit.
+    """
+    rng = random.Random(seed)
+    workspace = MockWorkspace()
+    workspace.add_database(main_database_id)
+    workspace.add_database(word_database_id)
+    workspace.add_database(expression_database_id)
+    words = [f"word{i}" for i in range(vocabulary)]
+    expressions = [f"{words[i]} {words[(i * 7 + 1) % vocabulary]}" for i in range(vocabulary // 4)]
+    for word in words:
+        workspace.dictionary[word] = [
+            {
+                "meta": {"id": f"{word}:1"},
+                "hwi": {"hw": word, "prs": [{"mw": word, "sound": {"audio": word}}]},
+                "fl": "noun",
+                "shortdef": [f"definition of {word}"],
+            }
+        ]
+    for unit in words + expressions:
+        if rng.random() < known_ratio:
+            database_id = expression_database_id if " " in unit else word_database_id
+            workspace.add_page({"database_id": database_id}, unit)
+
+    def fill(parent_id: str, level: int):
+        for _ in range(breadth):
+            roll = rng.random()
+            if level < depth and roll < subpage_ratio:
+                page_id = workspace.add_page({"page_id": parent_id}, f"subpage {rng.randrange(10**6)}")
+                fill(page_id, level + 1)
+            elif roll < 0.5:
+                runs = [_rich_text("some context before ")]
+                if rng.random() < unit_density:
+                    unit = rng.choice(expressions) if rng.random() < 0.2 else rng.choice(words)
+                    runs.append(_rich_text(unit, bold=True, italic=True))
+                runs.append(_rich_text(" and after."))
+                block_id = workspace.add_block(parent_id, "bulleted_list_item", {"rich_text": runs, "color": "default"})
+                if level < depth and rng.random() < 0.3:
+                    fill(block_id, level + 1)
+            elif roll < 0.5 + table_ratio:
+                table = {"table_width": 2, "has_column_header": False, "has_row_header": False}
+                table_id = workspace.add_block(parent_id, "table", table)
+                for _ in range(3):
+                    cells = [[_rich_text("cell")], [_rich_text("cell")]]
+                    workspace.add_block(table_id, "table_row", {"cells": cells})
+            else:
+                paragraph = {"rich_text": [_rich_text("plain text")], "color": "default"}
+                workspace.add_block(parent_id, "paragraph", paragraph)
+
+    contexts_option = {"id": "ctx", "type": "multi_select", "multi_select": [{"name": "Contexts"}]}
+    for i in range(contexts):
+        context_id = workspace.add_page({"database_id": main_database_id}, f"context {i}", {"type": contexts_option})
+        fill(context_id, 1)
+    return workspace
+
+
+if __name__ == "__main__":
+    from main import SyntheticOperation
+
+    parser = argparse.ArgumentParser(description="Serve a generated mock Notion + Merriam-Webster workspace.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--contexts", type=int, default=5)
+    parser.add_argument("--breadth", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=3)
+    args = parser.parse_args()
+    workspace = generate_workspace(
+        SyntheticOperation.MAINDATABASE_ID,
+        SyntheticOperation.WORDDATABASE_ID,
+        SyntheticOperation.EXPRDATABASE_ID,
+        contexts=args.contexts,
+        breadth=args.breadth,
+        depth=args.depth,
+    )
+    server = MockServer(workspace, port=args.port, latency=args.latency, rate_limit=args.rate_limit)
+    print(f"NOTION_BASE_URL={server.notion_base_url} MW_BASE_URL={server.mw_base_url}")
+    server.serve_forever()
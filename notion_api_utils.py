@@ -1,48 +1,190 @@
 import os
-import requests
 import json
+import asyncio
+import time
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from settings import DEBUG, _NotionObject, _NotionID, _NotionResponse
-from typing import Union, Dict, List, Any
-import inspect
+from settings import DEBUG, NOTION_BASE_URL, NOTION_RATE_LIMIT, NOTION_RATE_BURST
+from settings import _NotionObject, _NotionID, _NotionResponse
+from http_utils import HTTPTransport, AsyncHTTPTransport, TokenBucket, RetryPolicy, json_loads
+from traversal_utils import ConcurrentUnfolder, TraversalPolicy, TraversalStats
+from record_utils import BlockRecord
+from block_utils import context_paragraph
+from extraction_utils import UnitMatcher, UnitRule, DEFAULT_UNIT_RULES
+from cache_utils import LRUCache
+from metrics_utils import HTTPMetrics
+from trace_utils import span, traced
+from index_utils import UnitIndex, UnitIndexError
+from store_utils import SyncStateStore
+from typing import Union, Dict, List, Any, Optional, Tuple, Iterator, Iterable, AsyncIterator, Callable
 
 
 class NotionAPIError(Exception):
-    """Base exception class for NotionAPI."""
+    """Base exception class for NotionAPI; status_code is set when the error is an API response."""
 
-    pass
+    def __init__(self, message: str = "", status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 
 class NotionAPI:
-    BASE_URL: str = "https://api.notion.com/v1"
+    BASE_URL: str = NOTION_BASE_URL
+    # template only; every instance builds its own copy so different keys never overwrite each other
     HEADERS: Dict[str, str] = {
         "Authorization": "",
         "Notion-Version": "2022-06-28",
         "Content-Type": "application/json",
     }
     debug_mode: bool = DEBUG
-
-    def __init__(self, api_key: str):
+    # Notion accepts at most 100 children per create_page or append_block_children request
+    CHILDREN_PER_REQUEST: int = 100
+
+    def __init__(
+        self,
+        api_key: str,
+        transport: Optional[HTTPTransport] = None,
+        pool_size: int = 10,
+        timeout: Union[float, Tuple[float, float]] = (5, 30),
+        rate_limiter: Optional[TokenBucket] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        read_cache: Optional[LRUCache] = None,
+        metrics: Optional[HTTPMetrics] = None,
+        keep_raw_blocks: bool = False,
+    ):
         if api_key is None:
             raise NotionAPIError("No API key provided.")
-        self.HEADERS["Authorization"] = f"Bearer {api_key}"
+        self.headers: Dict[str, str] = {**self.HEADERS, "Authorization": f"Bearer {api_key}"}
+        self.transport = transport or HTTPTransport(self.headers, pool_size=pool_size, timeout=timeout)
+        # Notion allows an average of 3 requests per second with some bursting; stay at the limit instead of over it
+        self.rate_limiter = rate_limiter or TokenBucket(rate=NOTION_RATE_LIMIT, burst=NOTION_RATE_BURST)
+        self.retry_policy = retry_policy or RetryPolicy()
+        # reads of pages, blocks and block children are served from here until a mutation invalidates them
+        self.read_cache = read_cache or LRUCache(maxsize=4096)
+        # per-endpoint request metrics; None disables instrumentation
+        self.metrics = metrics
+        # BlockRecords keep the raw block json as well; for debugging only, it defeats their purpose
+        self.keep_raw_blocks = keep_raw_blocks
+
+    def close(self):
+        self.transport.close()
+
+    def clear_cache(self):
+        """Drop every cached read; call at the start of a run to scope the cache to that run."""
+        self.read_cache.clear()
+
+    def cache_stats(self) -> Dict[str, int]:
+        return self.read_cache.stats()
 
     # helper methods
-    def _handle_response(self, response) -> _NotionResponse:
+    def _request(
+        self,
+        method: str,
+        url: str,
+        endpoint: str,
+        data: Optional[Dict[str, Any]] = None,
+        idempotent: Optional[bool] = None,
+    ) -> _NotionResponse:
+        """
+        Send one request through the instance transport and hand the response to _handle_response; every attempt
+        draws from the shared rate limiter, and 429/transient 5xx responses are retried with backoff.
+        endpoint names the calling wrapper (e.g. "get_page") for metrics and debug output.
+        """
+        idempotent = method == "GET" if idempotent is None else idempotent
+        with span(f"notion.{endpoint}", "api", method=method):
+            return self._send(method, url, endpoint, data, idempotent)
+
+    def _send(
+        self, method: str, url: str, endpoint: str, data: Optional[Dict[str, Any]], idempotent: bool
+    ) -> _NotionResponse:
+        attempt = 0
+        while True:
+            with span("notion.rate_limit_wait", "wait"):
+                self.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.transport.request(method, url, headers=self.headers, json=data)
+            except RetryPolicy.RETRY_EXCEPTIONS:
+                self._observe(method, endpoint, None, started)
+                if not self.retry_policy.should_retry(attempt, None, idempotent):
+                    raise
+                response = None
+            else:
+                self._observe(method, endpoint, response, started)
+            if not self.retry_policy.should_retry(attempt, response, idempotent):
+                break
+            time.sleep(self._backoff(attempt, response, method, endpoint))
+            attempt += 1
+        return self._handle_response(response, endpoint)
+
+    def _observe(self, method: str, endpoint: str, response, started: float):
+        if self.metrics is None:
+            return
+        latency = time.perf_counter() - started
+        if response is None:
+            self.metrics.observe("notion", method, endpoint, None, latency)
+            return
+        bytes_sent = len(response.request.body or b"") if response.request is not None else 0
+        self.metrics.observe(
+            "notion", method, endpoint, response.status_code, latency, bytes_sent, len(response.content)
+        )
+
+    def _copy_cached(self, value):
+        """
+        Cached objects are shared, while callers attach keys (parent_page_id, unit) to what they get back; hand out
+        shallow copies so those additions never leak into the cache.
+        """
+        if isinstance(value, list):
+            return [item.copy() for item in value]
+        return value.copy()
+
+    def _cached(self, key: tuple, loader) -> Any:
+        return self._copy_cached(self.read_cache.get_or_load(key, loader))
+
+    def _invalidate(self, object_id: _NotionID, *kinds: str):
+        object_id = self._clean_id(object_id)
+        for kind in kinds:
+            self.read_cache.invalidate((kind, object_id))
+
+    def invalidate_tree(self, block_id: _NotionID):
+        """
+        Drop the cached reads of a block and of everything cached below it, e.g. once its page is known to have
+        changed; the cached listings themselves tell which descendants to drop, so nothing is fetched.
+        """
+        stack = [self._clean_id(block_id)]
+        while stack:
+            object_id = stack.pop()
+            for kind in ("records", "children"):
+                listing = self.read_cache.get((kind, object_id)) or ()
+                stack.extend(self._clean_id(child["id"]) for child in listing if child["has_children"])
+            self._invalidate(object_id, "records", "children", "block", "page")
+
+    def _backoff(self, attempt: int, response, method: str, endpoint: str) -> float:
+        if self.metrics is not None:
+            self.metrics.observe_retry("notion", method, endpoint)
+        delay = self.retry_policy.delay(attempt, response)
+        if response is not None and response.status_code == 429:
+            # a 429 means the shared budget is exhausted, so hold every caller on this instance, not just this one
+            self.rate_limiter.pause(delay)
+        if self.debug_mode:
+            status = response.status_code if response is not None else "connection error"
+            print(f"Retrying after {status}: attempt {attempt + 1}, sleeping {delay:.2f}s")
+        return delay
+
+    def _handle_response(self, response, endpoint: str = "") -> _NotionResponse:
         """Centralized method to handle API response for debug and error code."""
         status_code = response.status_code
         if self.debug_mode:
-            # add the calling function name to the file name as context information
-            calling_function_name = inspect.stack()[1].function
+            # add the endpoint name to the file name as context information
             try:
-                with open(f".notion_response_from_{calling_function_name}.json", "w") as f:
+                with open(f".notion_response_from_{endpoint}.json", "w") as f:
                     json.dump(response.json(), f, indent=4)
             except:
                 # account for the case when response.json() is not json serializable
                 print("Failed to write response.json() to file; most likely response is not json serializable.")
         match status_code:
             case 200:
-                return response.json()
+                return json_loads(response)
             case 400:
                 error_message = "Bad Request: The request was malformed"
             case 401:
@@ -53,9 +195,11 @@ class NotionAPI:
                 error_message = "Not Found: The resource does not exist."
             case 429:
                 error_message = "Too Many Requests: Rate limit exceeded."
+            case 500 | 502 | 503 | 504:
+                error_message = "Server Error: Notion is unavailable or timed out."
             case _:
                 error_message = "Unknown error."
-        raise NotionAPIError(f"{status_code}: {error_message}")
+        raise NotionAPIError(f"{status_code}: {error_message}", status_code)
 
     def _clean_id(self, id_str: str) -> _NotionID:
         """Remove '-' characters from the given string; consistent id_str format leads to more predictable behavior."""
@@ -64,91 +208,410 @@ class NotionAPI:
     # basic endpoints wrappers
     def get_page(self, page_id: _NotionID) -> _NotionObject:
         url = f"{self.BASE_URL}/pages/{self._clean_id(page_id)}"
-        response = requests.get(url, headers=self.HEADERS)
-        return self._handle_response(response)
+        loader = functools.partial(self._request, "GET", url, "get_page")
+        return self._cached(("page", self._clean_id(page_id)), loader)
 
     def get_block(self, block_id: _NotionID) -> _NotionObject:
         url = f"{self.BASE_URL}/blocks/{self._clean_id(block_id)}"
-        response = requests.get(url, headers=self.HEADERS)
-        return self._handle_response(response)
+        loader = functools.partial(self._request, "GET", url, "get_block")
+        return self._cached(("block", self._clean_id(block_id)), loader)
 
     def create_page(
         self, database_id: _NotionID, properties: Dict[str, Any], children: List[_NotionObject]
     ) -> _NotionObject:
+        """
+        create a page in a database; children beyond CHILDREN_PER_REQUEST are appended to the new page in chunks
+        right after, so pages of any length can be created.
+        """
         url = f"{self.BASE_URL}/pages"
-        data = {"parent": {"database_id": self._clean_id(database_id)}, "properties": properties, "children": children}
-        response = requests.post(url, headers=self.HEADERS, json=data)
-        return self._handle_response(response)
+        first, rest = children[: self.CHILDREN_PER_REQUEST], children[self.CHILDREN_PER_REQUEST :]
+        data = {"parent": {"database_id": self._clean_id(database_id)}, "properties": properties, "children": first}
+        page = self._request("POST", url, "create_page", data)
+        for start in range(0, len(rest), self.CHILDREN_PER_REQUEST):
+            self.append_block_children(page["id"], rest[start : start + self.CHILDREN_PER_REQUEST])
+        return page
 
     def update_page(self, page_id: _NotionID, properties: Dict[str, Any]) -> _NotionObject:
         url = f"{self.BASE_URL}/pages/{self._clean_id(page_id)}"
         data = {"properties": properties}
-        response = requests.patch(url, headers=self.HEADERS, json=data)
-        return self._handle_response(response)
+        page = self._request("PATCH", url, "update_page", data)
+        self._invalidate(page_id, "page", "block")
+        return page
 
     def get_database(self, database_id: _NotionID) -> _NotionObject:
         """units database_id  =  79abdc9bdbc14a1488ae0297bc756145"""
         url = f"{self.BASE_URL}/databases/{self._clean_id(database_id)}"
-        response = requests.get(url, headers=self.HEADERS)
-
-        return self._handle_response(response)
+        return self._request("GET", url, "get_database")
+
+    def query_database(
+        self, database_id: _NotionID, filter: Optional[Dict[str, Any]] = None, page_size: int = 100
+    ) -> List[_NotionObject]:
+        return [
+            page
+            for results, _ in self.iter_query_database_pages(database_id, filter, page_size, prefetch=False)
+            for page in results
+        ]
 
-    def query_database(self, database_id: _NotionID, filter: Dict[str, Any]) -> List[_NotionObject]:
-        children = []
+    def iter_query_database(
+        self, database_id: _NotionID, filter: Optional[Dict[str, Any]] = None, page_size: int = 100
+    ) -> Iterator[_NotionObject]:
+        """query_database() one result at a time; see iter_query_database_pages()"""
+        for results, _ in self.iter_query_database_pages(database_id, filter, page_size):
+            yield from results
+
+    def iter_query_database_pages(
+        self,
+        database_id: _NotionID,
+        filter: Optional[Dict[str, Any]] = None,
+        page_size: int = 100,
+        start_cursor: Optional[str] = None,
+        prefetch: bool = True,
+    ) -> Iterator[Tuple[List[_NotionObject], Optional[str]]]:
+        """
+        yield (results, next_cursor) per page of the query, next_cursor None on the last page; pass a next_cursor back
+        as start_cursor to resume after it. With prefetch, the next page is requested while the caller works on the
+        current one; nothing further is requested once the caller stops iterating.
+        """
         url = f"{self.BASE_URL}/databases/{self._clean_id(database_id)}/query"
-        while True:
-            data = {"filter": filter}
-            response = requests.post(url, headers=self.HEADERS, json=data)
-            response_json = self._handle_response(response)
-            children.extend(response_json["results"])
-            if response_json["has_more"]:
-                url = f"https://api.notion.com/v1/databases/{database_id}/query?start_cursor={response_json['next_cursor']}"
-            else:
-                break
-        return children
+
+        def fetch(cursor: Optional[str]) -> _NotionResponse:
+            data = {"page_size": page_size}
+            if filter:
+                data["filter"] = filter
+            if cursor:
+                # the query endpoint paginates through the request body, not the url
+                data["start_cursor"] = cursor
+            # the query endpoint is a POST but read-only, so it is safe to retry
+            return self._request("POST", url, "query_database", data, idempotent=True)
+
+        return self._paginate(fetch, start_cursor, prefetch)
+
+    def _paginate(
+        self, fetch: Callable[[Optional[str]], _NotionResponse], start_cursor: Optional[str], prefetch: bool
+    ) -> Iterator[Tuple[List[_NotionObject], Optional[str]]]:
+        if not prefetch:
+            cursor = start_cursor
+            while True:
+                response_json = fetch(cursor)
+                cursor = response_json["next_cursor"] if response_json["has_more"] else None
+                yield response_json["results"], cursor
+                if cursor is None:
+                    return
+        # one page ahead: pages depend on the previous cursor, so more than one in flight is not possible
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="paginate")
+        try:
+            in_flight = executor.submit(fetch, start_cursor)
+            while in_flight is not None:
+                response_json = in_flight.result()
+                cursor = response_json["next_cursor"] if response_json["has_more"] else None
+                in_flight = executor.submit(fetch, cursor) if cursor is not None else None
+                yield response_json["results"], cursor
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
     def get_block_children(self, block_id: _NotionID) -> List[_NotionObject]:
         """
         Return a list of response.json() from each API call from the paginated API endpoint
         note the debug mode only writes the response.json() from the last API call to file.
         """
-        block_children = []
+        loader = functools.partial(self._fetch_block_children, block_id)
+        return self._cached(("children", self._clean_id(block_id)), loader)
+
+    def get_block_records(self, block_id: _NotionID) -> List[BlockRecord]:
+        """
+        get_block_children() reduced to compact BlockRecords at ingest; the raw block dicts are dropped right away
+        (unless keep_raw_blocks is set) and only the records are cached.
+        """
+        loader = functools.partial(self._fetch_block_records, block_id)
+        return self._cached(("records", self._clean_id(block_id)), loader)
+
+    def _fetch_block_records(self, block_id: _NotionID) -> List[BlockRecord]:
+        keep_raw = self.keep_raw_blocks
+        return [BlockRecord.from_json(block, keep_raw) for block in self._fetch_block_children(block_id)]
+
+    def get_block_records_page(
+        self, block_id: _NotionID, start_cursor: Optional[str] = None
+    ) -> Tuple[List[BlockRecord], Optional[str]]:
+        """
+        one page of get_block_records() as (records, next_cursor), next_cursor None on the last page. A listing
+        already cached is served whole; a listing that fits in one page is cached like get_block_records() does.
+        """
+        key = ("records", self._clean_id(block_id))
+        if start_cursor is None:
+            cached = self.read_cache.get(key)
+            if cached is not None:
+                return self._copy_cached(cached), None
+        response_json = self._fetch_block_children_page(block_id, start_cursor)
+        keep_raw = self.keep_raw_blocks
+        records = [BlockRecord.from_json(block, keep_raw) for block in response_json["results"]]
+        next_cursor = response_json["next_cursor"] if response_json["has_more"] else None
+        if start_cursor is None and next_cursor is None:
+            self.read_cache.put(key, records)
+            records = self._copy_cached(records)
+        return records, next_cursor
+
+    def iter_block_children(self, block_id: _NotionID, page_size: int = 100) -> Iterator[_NotionObject]:
+        """get_block_children() one block at a time, uncached; see iter_block_children_pages()"""
+        for results, _ in self.iter_block_children_pages(block_id, page_size):
+            yield from results
+
+    def iter_block_children_pages(
+        self,
+        block_id: _NotionID,
+        page_size: int = 100,
+        start_cursor: Optional[str] = None,
+        prefetch: bool = True,
+    ) -> Iterator[Tuple[List[_NotionObject], Optional[str]]]:
+        """(results, next_cursor) per page of the block's children, as iter_query_database_pages() does"""
+        return self._paginate(
+            functools.partial(self._fetch_block_children_page, block_id, page_size=page_size), start_cursor, prefetch
+        )
+
+    def _fetch_block_children_page(
+        self, block_id: _NotionID, start_cursor: Optional[str] = None, page_size: int = 100
+    ) -> _NotionResponse:
+        url = f"{self.BASE_URL}/blocks/{self._clean_id(block_id)}/children?page_size={page_size}"
+        if start_cursor:
+            url += f"&start_cursor={start_cursor}"
+        return self._request("GET", url, "get_block_children")
+
+    def _fetch_block_children(self, block_id: _NotionID) -> List[_NotionObject]:
+        return [
+            block for results, _ in self.iter_block_children_pages(block_id, prefetch=False) for block in results
+        ]
+
+    def append_block_children(self, block_id: _NotionID, children: List[_NotionObject]) -> _NotionObject:
         url = f"{self.BASE_URL}/blocks/{self._clean_id(block_id)}/children"
+        data = {"children": children}
+        response_json = self._request("PATCH", url, "append_block_children", data)
+        # has_children, the children list and the last edited time of the target all change with an append
+        self._invalidate(block_id, "children", "records", "block", "page")
+        return response_json
+
+
+class AsyncNotionAPI(NotionAPI):
+    """
+    asyncio counterpart of NotionAPI with the same method surface; every endpoint wrapper is a coroutine, so callers
+    can keep many requests in flight (e.g. with asyncio.gather) over the pooled keep-alive connections.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        transport: Optional[AsyncHTTPTransport] = None,
+        pool_size: int = 10,
+        timeout: Union[float, Tuple[float, float]] = (5, 30),
+        rate_limiter: Optional[TokenBucket] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        read_cache: Optional[LRUCache] = None,
+        metrics: Optional[HTTPMetrics] = None,
+        keep_raw_blocks: bool = False,
+    ):
+        super().__init__(
+            api_key,
+            transport.transport if transport else None,
+            pool_size,
+            timeout,
+            rate_limiter,
+            retry_policy,
+            read_cache,
+            metrics,
+            keep_raw_blocks,
+        )
+        self.async_transport = transport or AsyncHTTPTransport(self.transport)
+
+    def close(self):
+        self.async_transport.close()
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        endpoint: str,
+        data: Optional[Dict[str, Any]] = None,
+        idempotent: Optional[bool] = None,
+    ) -> _NotionResponse:
+        idempotent = method == "GET" if idempotent is None else idempotent
+        attempt = 0
         while True:
-            response = requests.get(url, headers=self.HEADERS)
-            response_json = self._handle_response(response)
-            block_children.extend(response_json["results"])
-            # If there's more data to fetch
-            if response_json["has_more"]:
-                url = (
-                    f"https://api.notion.com/v1/blocks/{block_id}/children?start_cursor={response_json['next_cursor']}"
-                )
+            await self.rate_limiter.acquire_async()
+            started = time.perf_counter()
+            try:
+                response = await self.async_transport.request(method, url, headers=self.headers, json=data)
+            except RetryPolicy.RETRY_EXCEPTIONS:
+                self._observe(method, endpoint, None, started)
+                if not self.retry_policy.should_retry(attempt, None, idempotent):
+                    raise
+                response = None
             else:
+                self._observe(method, endpoint, response, started)
+            if not self.retry_policy.should_retry(attempt, response, idempotent):
                 break
+            await asyncio.sleep(self._backoff(attempt, response, method, endpoint))
+            attempt += 1
+        return self._handle_response(response, endpoint)
+
+    async def _cached(self, key: tuple, loader) -> Any:
+        return self._copy_cached(await self.read_cache.get_or_load_async(key, loader))
+
+    async def get_page(self, page_id: _NotionID) -> _NotionObject:
+        return await super().get_page(page_id)
+
+    async def get_block(self, block_id: _NotionID) -> _NotionObject:
+        return await super().get_block(block_id)
+
+    async def create_page(
+        self, database_id: _NotionID, properties: Dict[str, Any], children: List[_NotionObject]
+    ) -> _NotionObject:
+        url = f"{self.BASE_URL}/pages"
+        first, rest = children[: self.CHILDREN_PER_REQUEST], children[self.CHILDREN_PER_REQUEST :]
+        data = {"parent": {"database_id": self._clean_id(database_id)}, "properties": properties, "children": first}
+        page = await self._request("POST", url, "create_page", data)
+        for start in range(0, len(rest), self.CHILDREN_PER_REQUEST):
+            await self.append_block_children(page["id"], rest[start : start + self.CHILDREN_PER_REQUEST])
+        return page
+
+    async def update_page(self, page_id: _NotionID, properties: Dict[str, Any]) -> _NotionObject:
+        url = f"{self.BASE_URL}/pages/{self._clean_id(page_id)}"
+        page = await self._request("PATCH", url, "update_page", {"properties": properties})
+        self._invalidate(page_id, "page", "block")
+        return page
+
+    async def get_database(self, database_id: _NotionID) -> _NotionObject:
+        return await super().get_database(database_id)
+
+    async def query_database(
+        self, database_id: _NotionID, filter: Optional[Dict[str, Any]] = None, page_size: int = 100
+    ) -> List[_NotionObject]:
+        children = []
+        async for results, _ in self.iter_query_database_pages(database_id, filter, page_size, prefetch=False):
+            children.extend(results)
+        return children
+
+    async def iter_query_database(
+        self, database_id: _NotionID, filter: Optional[Dict[str, Any]] = None, page_size: int = 100
+    ) -> AsyncIterator[_NotionObject]:
+        async for results, _ in self.iter_query_database_pages(database_id, filter, page_size):
+            for page in results:
+                yield page
+
+    async def _paginate(
+        self, fetch: Callable[[Optional[str]], Any], start_cursor: Optional[str], prefetch: bool
+    ) -> AsyncIterator[Tuple[List[_NotionObject], Optional[str]]]:
+        """async counterpart of NotionAPI._paginate(), so the iter_*_pages methods return async iterators here"""
+        in_flight = asyncio.ensure_future(fetch(start_cursor))
+        try:
+            while in_flight is not None:
+                response_json = await in_flight
+                cursor = response_json["next_cursor"] if response_json["has_more"] else None
+                in_flight = None
+                if cursor is not None:
+                    next_page = fetch(cursor)
+                    # without prefetch the next request only starts once the caller asks for it
+                    in_flight = asyncio.ensure_future(next_page) if prefetch else next_page
+                yield response_json["results"], cursor
+        finally:
+            if isinstance(in_flight, asyncio.Future):
+                in_flight.cancel()
+            elif in_flight is not None:
+                in_flight.close()
+
+    async def get_block_children(self, block_id: _NotionID) -> List[_NotionObject]:
+        loader = functools.partial(self._fetch_block_children, block_id)
+        return await self._cached(("children", self._clean_id(block_id)), loader)
+
+    async def get_block_records(self, block_id: _NotionID) -> List[BlockRecord]:
+        loader = functools.partial(self._fetch_block_records, block_id)
+        return await self._cached(("records", self._clean_id(block_id)), loader)
+
+    async def _fetch_block_records(self, block_id: _NotionID) -> List[BlockRecord]:
+        keep_raw = self.keep_raw_blocks
+        return [BlockRecord.from_json(block, keep_raw) for block in await self._fetch_block_children(block_id)]
+
+    async def get_block_records_page(
+        self, block_id: _NotionID, start_cursor: Optional[str] = None
+    ) -> Tuple[List[BlockRecord], Optional[str]]:
+        key = ("records", self._clean_id(block_id))
+        if start_cursor is None:
+            cached = self.read_cache.get(key)
+            if cached is not None:
+                return self._copy_cached(cached), None
+        response_json = await self._fetch_block_children_page(block_id, start_cursor)
+        keep_raw = self.keep_raw_blocks
+        records = [BlockRecord.from_json(block, keep_raw) for block in response_json["results"]]
+        next_cursor = response_json["next_cursor"] if response_json["has_more"] else None
+        if start_cursor is None and next_cursor is None:
+            self.read_cache.put(key, records)
+            records = self._copy_cached(records)
+        return records, next_cursor
+
+    async def iter_block_children(self, block_id: _NotionID, page_size: int = 100) -> AsyncIterator[_NotionObject]:
+        async for results, _ in self.iter_block_children_pages(block_id, page_size):
+            for block in results:
+                yield block
+
+    async def _fetch_block_children(self, block_id: _NotionID) -> List[_NotionObject]:
+        block_children = []
+        async for results, _ in self.iter_block_children_pages(block_id, prefetch=False):
+            block_children.extend(results)
         return block_children
 
-    def append_block_children(self, block_id: _NotionID, children: List[_NotionObject]) -> _NotionObject:
+    async def append_block_children(self, block_id: _NotionID, children: List[_NotionObject]) -> _NotionObject:
         url = f"{self.BASE_URL}/blocks/{self._clean_id(block_id)}/children"
-        data = {"children": children}
-        response = requests.patch(url, headers=self.HEADERS, json=data)
-        return self._handle_response(response)
+        response_json = await self._request("PATCH", url, "append_block_children", {"children": children})
+        self._invalidate(block_id, "children", "records", "block", "page")
+        return response_json
 
 
 class CEPagesManager:
     debug_mode: bool = DEBUG
-
-    def __init__(self, api_key: str):
-        self.notion_api_call = NotionAPI(api_key)
-
+    CHILDREN_PER_REQUEST: int = NotionAPI.CHILDREN_PER_REQUEST
+
+    def __init__(
+        self,
+        api_key: str,
+        max_workers: int = 8,
+        unit_index: Optional[UnitIndex] = None,
+        sync_store: Optional[SyncStateStore] = None,
+        metrics: Optional[HTTPMetrics] = None,
+        transport: Optional[HTTPTransport] = None,
+        keep_raw_blocks: bool = False,
+        unit_rules: Iterable[UnitRule] = DEFAULT_UNIT_RULES,
+        traversal_policy: Optional[TraversalPolicy] = None,
+    ):
+        self.notion_api_call = NotionAPI(
+            api_key, transport=transport, pool_size=max_workers, metrics=metrics, keep_raw_blocks=keep_raw_blocks
+        )
+        # number of concurrent fetches while unfolding a block tree
+        self.max_workers = max_workers
+        # when a database is indexed locally, membership checks are answered without querying Notion
+        self.unit_index = unit_index
+        # local extraction watermarks; child pages known here are sync-checked without any request
+        self.sync_store = sync_store
+        # every unit rule, compiled into the single-pass matcher used by extract_units and iter_units_and_mark_sync
+        self.unit_matcher = UnitMatcher(unit_rules)
+        # which subtrees the unfolders fetch (by default all but those that cannot hold a unit), and what they skipped
+        self.traversal_policy = traversal_policy or TraversalPolicy()
+        self.traversal_stats = TraversalStats()
+
+    @traced()
     def if_unit_in_database(self, unit_name: str, database_id: _NotionID) -> bool:
         """
         check if the given unit is already in the database with the given database_id
         """
+        if self.unit_index is not None and self.unit_index.is_indexed(database_id):
+            try:
+                return self.unit_index.lookup(database_id, unit_name) or False
+            except UnitIndexError as e:
+                raise NotionAPIError(str(e))
         filter = {"property": "Name", "title": {"equals": unit_name}}
-        units_pages = self.notion_api_call.query_database(database_id, filter)
-        if units_pages:
+        units_pages = []
+        # stop reading as soon as a second page shows the title is ambiguous
+        for unit_page in self.notion_api_call.iter_query_database(database_id, filter):
+            units_pages.append(unit_page)
             if len(units_pages) > 1:
                 raise NotionAPIError(f"More than one page found for the unit {unit_name}.")
+        if units_pages:
             return units_pages[0]["id"]
         else:
             return False
@@ -158,27 +621,22 @@ class CEPagesManager:
         append a new context to the unit page
         wait for further adjustment to better add context
         """
-        children = [
-            {
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": f"{unit_name}",
-                                "link": {"url": unit_url},
-                            },
-                        },
-                    ]
-                },
-            },
-        ]
+        children = [self._context_paragraph(unit_name, unit_url)]
 
         return self.notion_api_call.append_block_children(unitpage_id, children)
 
-    def get_contexts_from_database(self, database_id: _NotionID) -> List[_NotionObject]:
+    def _context_paragraph(self, unit_name: str, unit_url: str) -> _NotionObject:
+        return context_paragraph(unit_name, unit_url)
+
+    @traced()
+    def get_contexts_from_database(
+        self, database_id: _NotionID, edited_since: Optional[str] = None
+    ) -> List[_NotionObject]:
+        """the context pages of the main database; with edited_since (ISO 8601), only those edited since then"""
         filter = {"property": "type", "multi_select": {"contains": "Contexts"}}
+        if edited_since is not None:
+            edited_filter = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": edited_since}}
+            filter = {"and": [filter, edited_filter]}
         contexts = self.notion_api_call.query_database(database_id, filter)
         for context in contexts:
             if context["object"] != "page":
@@ -203,6 +661,8 @@ class CEPagesManager:
                 "When trying to get the syc state of an object, it does not have a 'Last edited time' property."
             )
         last_edited_time = context["properties"]["Last edited time"]["last_edited_time"] or ""
+        if self.sync_store is not None:
+            self.sync_store.record(self._clean_id(context_id), last_edited_time, last_extracted_time)
         sync_state = self._date_time_compare(last_extracted_time, last_edited_time)
         if DEBUG:
             print(f"last_extracted_time: {last_extracted_time}")
@@ -213,6 +673,21 @@ class CEPagesManager:
 
         return sync_state
 
+    @traced()
+    def is_child_page_synced(self, child_page: _NotionObject) -> bool:
+        """
+        sync state of a child_page block as listed by get_block_children: decided locally from the block's own
+        last_edited_time when the page has a watermark in the sync store, otherwise by get_sync_status.
+        """
+        if self.sync_store is not None:
+            page_id = self._clean_id(child_page["id"])
+            last_extracted_time = self.sync_store.last_extracted_time(page_id)
+            if last_extracted_time is not None:
+                last_edited_time = child_page.get("last_edited_time", "")
+                self.sync_store.observe(page_id, last_edited_time)
+                return self._date_time_compare(last_extracted_time, last_edited_time)
+        return self.get_sync_status(child_page["id"])
+
     def _date_time_compare(self, last_extracted_time: str, last_edited_time: str) -> bool:
         # Normalize the date strings
         if not last_extracted_time or not last_edited_time:
@@ -231,80 +706,74 @@ class CEPagesManager:
         # Compare the two datetime objects
         return edition_format <= extraction_format  # sync when the last edited time is before the last extracted time
 
-    def update_extraction_time(self, context: _NotionObject) -> _NotionObject:
-        """
-        update the last extraction time for the given context
-        """
-
+    def extraction_time_properties(self) -> Tuple[str, Dict[str, Any]]:
+        """(extraction time, page properties setting it) for an extraction happening now"""
         # Get the current date and time in UTC
         current_utc_time = datetime.utcnow()
 
         # Extract the date and minute
         formatted_time = current_utc_time.strftime("%Y-%m-%dT%H:%M") + ":00.000+00:00"
         properties = {"Last extracted time": {"date": {"start": formatted_time, "end": None, "time_zone": None}}}
+        return formatted_time, properties
 
-        return self.notion_api_call.update_page(context["id"], properties)
+    @traced()
+    def update_extraction_time(self, context: _NotionObject) -> _NotionObject:
+        """
+        update the last extraction time for the given context
+        """
+        formatted_time, properties = self.extraction_time_properties()
+        page = self.notion_api_call.update_page(context["id"], properties)
+        if self.sync_store is not None:
+            self.sync_store.mark_extracted(self._clean_id(context["id"]), formatted_time)
+        return page
+
+    def _unfolder_for(self, block_id: _NotionID) -> ConcurrentUnfolder:
+        """unfolder of the tree under a page or database; child pages are sync-checked by is_child_page_synced"""
+        block_type = self.notion_api_call.get_block(block_id)["type"]
+        if block_type not in ("child_page", "child_database"):
+            raise NotionAPIError("currently, method unfold_block() only accepts page_id or database_id as input.")
+        return ConcurrentUnfolder(
+            self.notion_api_call.get_block_records_page,
+            self.is_child_page_synced,
+            max_workers=self.max_workers,
+            policy=self.traversal_policy,
+            stats=self.traversal_stats,
+        )
 
     def unfold_block_and_mark_sync(self, block_id: _NotionID) -> [List[_NotionObject], List[_NotionObject]]:
         """
-        unfold a block and return a list of all the children blocks recursively,
-        with the parent page id attached to each block.
+        unfold a block and return a list of all the children blocks recursively, as compact BlockRecords
+        (see get_block_records) with the parent page id attached to each block.
         parent_page_id is the page id of the page that contains the block, which is used in the url construct to refer
         to a block for better visual focus in the Notion UI.
+        the tree is walked breadth-first by a bounded worker pool (see ConcurrentUnfolder), so sibling subtrees and
+        sync checks are fetched in parallel; the returned lists keep document order.
         """
-        flat_block_children = []
-        child_pages_to_sync = []
-        block_type = self.notion_api_call.get_block(block_id)["type"]
-        if block_type not in ("child_page", "child_database"):
-            raise NotionAPIError("currently, method unfold_block() only accepts page_id or database_id as input.")
-        parent_page_id = block_id
-
-        def recursive_unfold_block(block_id: _NotionID, parent_page_id: _NotionID):
-            block_children = self.notion_api_call.get_block_children(block_id)
-            for block_child in block_children:
-                # attach the parent_page_id to each block
-                block_child["parent_page_id"] = parent_page_id
-                if block_child["type"] == "child_page":
-                    if self.get_sync_status(block_child["id"]):
-                        # if the child_page is synced, skip it and its children
-                        continue
-                    # only refresh the parent_page_id when the a page is not synced, for the use of children blocks
-                    parent_page_id = block_child["id"]
-                    # add a flag to indicate if the page needs to sync
-                    child_pages_to_sync.append(block_child)
-                # only append pages that are out of sync and the blocks within them
-                flat_block_children.append(block_child)
-                if block_child["has_children"]:
-                    recursive_unfold_block(block_child["id"], parent_page_id)
-
-        recursive_unfold_block(block_id, parent_page_id)  # start of the recursion
-
-        return flat_block_children, child_pages_to_sync
+        # only pages that are out of sync and the blocks within them are returned
+        return self._unfolder_for(block_id).unfold(block_id)
+
+    def iter_units_and_mark_sync(
+        self, block_id: _NotionID, child_pages_to_sync: List[_NotionObject]
+    ) -> Iterator[_NotionObject]:
+        """
+        streaming variant of unfold_block_and_mark_sync() where the unit rules run on each listing as it arrives: only
+        unit blocks (one per unit found, with "unit" set) are yielded, in arrival order, and every other block is
+        dropped at fetch time. The unsynced child pages are collected into child_pages_to_sync along the way.
+        """
+        yield from self._unfolder_for(block_id).iter_unfold(
+            block_id, child_pages_to_sync, extract=self.unit_matcher.match
+        )
 
     def extract_units(self, block_children: List[_NotionObject]) -> List[_NotionObject]:
-        """Return a list of unit blocks."""
-        units_blocks = []
-        for block in block_children:
-            unit_block = self._markdown_criteria_for_units(block)
-            if unit_block:
-                units_blocks.append(unit_block)
+        """
+        Return a list of unit blocks: a copy of a block with "unit" set for every unit the rules find in it, so a
+        block marking several units yields several unit blocks.
+        """
+        units_blocks = self.unit_matcher.extract(block_children)
         if self.debug_mode:
             print(f"Found {len(units_blocks)} units.")
         return units_blocks
 
-    def _markdown_criteria_for_units(self, block: _NotionObject) -> Union[int, str]:
-        """
-        this helper method returns either a valid "unit" string or False, serving as a
-        filter for the extract_units()
-        """
-        if block["type"] == "bulleted_list_item":
-            for rich_text in block["bulleted_list_item"]["rich_text"]:
-                # Check for bold and italic annotations
-                if rich_text["annotations"]["bold"] and rich_text["annotations"]["italic"]:
-                    block["unit"] = rich_text["plain_text"]
-                    return block
-        return False
-
     def url_for_extracted_unit(self, unit_block: _NotionObject) -> str:
         """Return a list of reference urls for each unit."""
         if "unit" not in unit_block:
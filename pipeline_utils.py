@@ -0,0 +1,144 @@
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from trace_utils import span
+
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a Pipeline: fn maps an item to an iterable of items for the next stage (empty or None drops it).
+    workers threads run fn concurrently; queue_size bounds the input queue of the stage, which is what gives
+    back-pressure to the stages before it. flush, when given, is called once after the stage has seen its last item
+    and may emit whatever the stage was holding back (e.g. partial batches).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Optional[Iterable[Any]]],
+        workers: int = 1,
+        queue_size: int = 100,
+        flush: Optional[Callable[[], Optional[Iterable[Any]]]] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size
+        self.flush = flush
+
+
+class Pipeline:
+    """
+    Streaming pipeline of stages connected by bounded queues: the source is consumed on its own thread, so every
+    stage overlaps with the others and at most queue_size items wait between two stages.
+    The first exception raised by the source or any stage stops the pipeline and is re-raised by run().
+    """
+
+    def __init__(self, source: Iterable[Any], stages: List[Stage]):
+        if not stages:
+            raise ValueError("a pipeline needs at least one stage.")
+        self.source = source
+        self.stages = stages
+        # items received and items emitted per stage
+        self.stats: Dict[str, Dict[str, int]] = {stage.name: {"in": 0, "out": 0} for stage in stages}
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self._lock = threading.Lock()
+
+    def run(self) -> List[Any]:
+        """run to completion and return whatever the last stage emitted"""
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        results: List[Any] = []
+        remaining_workers = [stage.workers for stage in self.stages]
+        threads = [threading.Thread(target=self._feed, args=(queues[0],), name="pipeline-source", daemon=True)]
+        for idx, stage in enumerate(self.stages):
+            next_queue = queues[idx + 1] if idx + 1 < len(queues) else None
+            for worker in range(stage.workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._work,
+                        args=(idx, queues[idx], next_queue, results, remaining_workers),
+                        name=f"pipeline-{stage.name}-{worker}",
+                        daemon=True,
+                    )
+                )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+        return results
+
+    def _fail(self, error: BaseException):
+        with self._lock:
+            self._errors.append(error)
+        self._stop.set()
+
+    def _feed(self, first_queue: queue.Queue):
+        try:
+            for item in self.source:
+                if self._stop.is_set():
+                    break
+                first_queue.put(item)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # a generator source stopped early still gets to release what it holds (e.g. its worker pool)
+            close = getattr(self.source, "close", None)
+            if close is not None:
+                close()
+            for _ in range(self.stages[0].workers):
+                first_queue.put(_DONE)
+
+    def _work(
+        self,
+        idx: int,
+        in_queue: queue.Queue,
+        next_queue: Optional[queue.Queue],
+        results: List[Any],
+        remaining: List[int],
+    ):
+        stage = self.stages[idx]
+        stats = self.stats[stage.name]
+        while True:
+            item = in_queue.get()
+            if item is _DONE:
+                break
+            if self._stop.is_set():
+                # keep draining so upstream puts never block on a stopped pipeline
+                continue
+            try:
+                with span(f"pipeline.{stage.name}", "pipeline"):
+                    outputs = stage.fn(item) or ()
+                with self._lock:
+                    stats["in"] += 1
+                self._emit(stats, outputs, next_queue, results)
+            except BaseException as e:
+                self._fail(e)
+        with self._lock:
+            remaining[idx] -= 1
+            last_worker = remaining[idx] == 0
+        if last_worker and stage.flush is not None and not self._stop.is_set():
+            try:
+                with span(f"pipeline.{stage.name}.flush", "pipeline"):
+                    outputs = stage.flush() or ()
+                self._emit(stats, outputs, next_queue, results)
+            except BaseException as e:
+                self._fail(e)
+        # the last worker of a stage to finish closes the next stage
+        if last_worker and next_queue is not None:
+            for _ in range(self.stages[idx + 1].workers):
+                next_queue.put(_DONE)
+
+    def _emit(self, stats: Dict[str, int], outputs: Iterable[Any], next_queue: Optional[queue.Queue], results: List):
+        for output in outputs:
+            with self._lock:
+                stats["out"] += 1
+            if next_queue is not None:
+                next_queue.put(output)
+            else:
+                with self._lock:
+                    results.append(output)
@@ -0,0 +1,139 @@
+from typing import Any, Dict, Optional, Tuple
+from settings import _NotionObject
+
+
+class TextRun:
+    """One rich_text run, reduced to its text and the annotations unit extraction looks at."""
+
+    __slots__ = ("plain_text", "bold", "italic", "strikethrough", "underline", "code", "color", "href")
+
+    def __init__(
+        self,
+        plain_text: str,
+        bold: bool = False,
+        italic: bool = False,
+        strikethrough: bool = False,
+        underline: bool = False,
+        code: bool = False,
+        color: str = "default",
+        href: Optional[str] = None,
+    ):
+        self.plain_text = plain_text
+        self.bold = bold
+        self.italic = italic
+        self.strikethrough = strikethrough
+        self.underline = underline
+        self.code = code
+        self.color = color
+        self.href = href
+
+    @classmethod
+    def from_json(cls, rich_text: Dict[str, Any]) -> "TextRun":
+        annotations = rich_text.get("annotations") or {}
+        return cls(
+            rich_text.get("plain_text", ""),
+            annotations.get("bold", False),
+            annotations.get("italic", False),
+            annotations.get("strikethrough", False),
+            annotations.get("underline", False),
+            annotations.get("code", False),
+            annotations.get("color", "default"),
+            rich_text.get("href"),
+        )
+
+
+class BlockRecord:
+    """
+    Compact stand-in for a block object from get_block_children, keeping only what the traversal, unit extraction
+    and url construction use. The raw json is kept only when asked for (debugging).
+    Plain fields can also be read and set with item access (block["id"], block["parent_page_id"] = ...), so code
+    written against raw block dicts keeps working.
+    """
+
+    __slots__ = ("id", "type", "has_children", "last_edited_time", "rich_text", "parent_page_id", "unit", "raw")
+    _ITEM_FIELDS = frozenset(("id", "type", "has_children", "last_edited_time", "parent_page_id", "unit", "raw"))
+
+    def __init__(
+        self,
+        id: str,
+        type: str,
+        has_children: bool = False,
+        last_edited_time: str = "",
+        rich_text: Tuple[TextRun, ...] = (),
+        parent_page_id: Optional[str] = None,
+        unit: Optional[str] = None,
+        raw: Optional[_NotionObject] = None,
+    ):
+        self.id = id
+        self.type = type
+        self.has_children = has_children
+        self.last_edited_time = last_edited_time
+        self.rich_text = rich_text
+        self.parent_page_id = parent_page_id
+        self.unit = unit
+        self.raw = raw
+
+    @classmethod
+    def from_json(cls, block: _NotionObject, keep_raw: bool = False) -> "BlockRecord":
+        payload = block.get(block["type"]) or {}
+        rich_text = payload.get("rich_text") if isinstance(payload, dict) else None
+        return cls(
+            block["id"],
+            block["type"],
+            block.get("has_children", False),
+            block.get("last_edited_time", ""),
+            tuple(TextRun.from_json(run) for run in rich_text) if rich_text else (),
+            block.get("parent_page_id"),
+            block.get("unit"),
+            block if keep_raw else None,
+        )
+
+    def copy(self) -> "BlockRecord":
+        # text runs are never mutated, so they are shared between copies
+        return BlockRecord(
+            self.id,
+            self.type,
+            self.has_children,
+            self.last_edited_time,
+            self.rich_text,
+            self.parent_page_id,
+            self.unit,
+            self.raw,
+        )
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._ITEM_FIELDS:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None and key in ("parent_page_id", "unit", "raw"):
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self._ITEM_FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self) -> str:
+        return f"BlockRecord(id={self.id!r}, type={self.type!r}, unit={self.unit!r})"
+
+
+def rich_text_runs(block) -> Tuple[TextRun, ...]:
+    """the text runs of a block given either as a BlockRecord or as a raw block dict"""
+    if isinstance(block, BlockRecord):
+        return block.rich_text
+    payload = block.get(block["type"]) or {}
+    return tuple(TextRun.from_json(run) for run in payload.get("rich_text") or ())
@@ -0,0 +1,41 @@
+import argparse
+import json
+import time
+from store_utils import OccurrenceIndex
+
+# where was a unit seen: answered from the occurrence index the refresh runs maintain, without any request
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the contexts a unit occurs in.")
+    parser.add_argument("query", help="a unit, or the start of one with --prefix")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--prefix", action="store_true", help="units starting with the words of the query")
+    mode.add_argument("--text", action="store_true", help="like --prefix, searching the context texts as well")
+    mode.add_argument("--fuzzy", action="store_true", help="units spelled close to the query")
+    parser.add_argument("--limit", type=int, default=20, help="most results shown by --prefix, --text and --fuzzy")
+    parser.add_argument("--json", action="store_true", help="one json object per result")
+    parser.add_argument("--index", default=".occurrences.sqlite3", help="path of the occurrence index")
+    args = parser.parse_args()
+
+    index = OccurrenceIndex(args.index)
+    started = time.perf_counter()
+    if args.fuzzy:
+        results = [{"unit": unit, "occurrences": count} for unit, count in index.fuzzy(args.query, args.limit)]
+    elif args.prefix or args.text:
+        results = [o._asdict() for o in index.search(args.query, args.limit, in_text=args.text)]
+    else:
+        results = [o._asdict() for o in index.lookup(args.query)]
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    index.close()
+
+    for result in results:
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False))
+        elif "url" in result:
+            print(f"{result['unit']}\t{result['url']}\t{result['text']}")
+        else:
+            print(f"{result['unit']}\t{result['occurrences']}")
+    if not args.json:
+        print(f"{len(results)} results in {elapsed_ms:.1f} ms")
+
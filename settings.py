@@ -1,6 +1,32 @@
 DEBUG = False
+import os
 from typing import NewType, Dict, Any
 
+# endpoints and client-side request budget; override through the environment to point at a local stand-in server
+NOTION_BASE_URL = os.environ.get("NOTION_BASE_URL", "https://api.notion.com/v1")
+MW_BASE_URL = os.environ.get("MW_BASE_URL", "https://www.dictionaryapi.com/api/v3/references/collegiate/json/")
+NOTION_RATE_LIMIT = float(os.environ.get("NOTION_RATE_LIMIT", "3"))
+NOTION_RATE_BURST = int(os.environ.get("NOTION_RATE_BURST", "10"))
+MW_RATE_LIMIT = float(os.environ.get("MW_RATE_LIMIT", "5"))
+MW_RATE_BURST = int(os.environ.get("MW_RATE_BURST", "5"))
+# when set, per-endpoint HTTP metrics are collected and written there in Prometheus text format after each run
+METRICS_PATH = os.environ.get("METRICS_PATH")
+# when set, the stages of each run are traced and written there in Chrome trace format (chrome://tracing, Perfetto)
+TRACE_PATH = os.environ.get("TRACE_PATH")
+# "record" captures every request/response of a run into CASSETTE_PATH, "replay" serves the run from it offline
+CASSETTE_MODE = os.environ.get("CASSETTE_MODE")
+CASSETTE_PATH = os.environ.get("CASSETTE_PATH", ".cassette.bin")
+# seconds added to each replayed response, and share of the recorded latency to replay
+CASSETTE_LATENCY = float(os.environ.get("CASSETTE_LATENCY", "0"))
+CASSETTE_LATENCY_SCALE = float(os.environ.get("CASSETTE_LATENCY_SCALE", "0"))
+# worker processes traversing contexts in parallel (sharing the Notion request budget); 0 keeps it in-process
+SHARD_PROCESSES = int(os.environ.get("SHARD_PROCESSES", "0"))
+# limits of the traversal of each context: nesting depth below the context, and blocks listed; 0 means no limit
+UNFOLD_MAX_DEPTH = int(os.environ.get("UNFOLD_MAX_DEPTH", "0"))
+UNFOLD_MAX_BLOCKS = int(os.environ.get("UNFOLD_MAX_BLOCKS", "0"))
+# keep the raw block json next to the compact block records of a traversal (debugging only, costs the memory back)
+KEEP_RAW_BLOCKS = DEBUG or bool(os.environ.get("KEEP_RAW_BLOCKS"))
+
 # datatypes
 # Define the base Notion_api type
 _NotionID = NewType("_NotionID", str)
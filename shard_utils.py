@@ -0,0 +1,156 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.managers import BaseManager
+from typing import Iterable, Iterator, List, Optional, Tuple
+from settings import _NotionID
+from http_utils import TokenBucket
+from record_utils import BlockRecord
+from extraction_utils import UnitRule, DEFAULT_UNIT_RULES
+from traversal_utils import TraversalPolicy
+
+
+class RateBudgetManager(BaseManager):
+    """Server process owning the one TokenBucket every shard draws from; clients talk to it over a local socket."""
+
+    pass
+
+
+RateBudgetManager.register("TokenBucket", TokenBucket, exposed=("reserve", "try_acquire", "pause"))
+
+
+class SharedTokenBucket:
+    """
+    TokenBucket interface over a proxy of the bucket in a RateBudgetManager. Only the reservation crosses the process
+    boundary; the wait happens in the caller, so the budget server is never blocked by a sleeping client.
+    """
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+    def reserve(self) -> float:
+        return self.proxy.reserve()
+
+    def try_acquire(self) -> bool:
+        return self.proxy.try_acquire()
+
+    def pause(self, seconds: float):
+        self.proxy.pause(seconds)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+# the pages manager of a shard worker process, built once by _init_shard
+_shard_pages = None
+
+
+def _init_shard(
+    api_key: str,
+    base_url: str,
+    rate_budget,
+    sync_store_path: Optional[str],
+    max_workers: int,
+    keep_raw_blocks: bool,
+    unit_rules: Tuple[UnitRule, ...],
+    traversal_policy: Optional[TraversalPolicy],
+):
+    # imported here: a spawned worker only needs the client side, not whatever imported this module
+    from notion_api_utils import CEPagesManager
+    from store_utils import SyncStateStore
+
+    global _shard_pages
+    sync_store = SyncStateStore(sync_store_path) if sync_store_path else None
+    _shard_pages = CEPagesManager(
+        api_key,
+        max_workers=max_workers,
+        sync_store=sync_store,
+        keep_raw_blocks=keep_raw_blocks,
+        unit_rules=unit_rules,
+        traversal_policy=traversal_policy,
+    )
+    _shard_pages.notion_api_call.BASE_URL = base_url
+    _shard_pages.notion_api_call.rate_limiter = SharedTokenBucket(rate_budget)
+
+
+def _unfold_context(context_id: _NotionID) -> Tuple[_NotionID, List[BlockRecord], List[BlockRecord]]:
+    """traverse and extract one context in a shard worker: (context_id, unit blocks, child pages to sync)"""
+    child_pages_to_sync = []
+    unit_blocks = list(_shard_pages.iter_units_and_mark_sync(context_id, child_pages_to_sync))
+    return context_id, unit_blocks, child_pages_to_sync
+
+
+class ShardedUnfolder:
+    """
+    Traversal and unit extraction of independent contexts spread over a pool of worker processes, so JSON decoding
+    and rule matching use more than one core. Every worker draws from one global request budget held by a
+    RateBudgetManager, which the parent's own client should share too (see rate_limiter). Workers only read: unit
+    blocks come back to the parent, which merges them across shards and alone resolves and creates unit pages, so a
+    unit found by several shards is still created once.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        processes: int,
+        rate: float,
+        burst: int,
+        sync_store_path: Optional[str] = None,
+        max_workers: int = 8,
+        keep_raw_blocks: bool = False,
+        unit_rules: Iterable[UnitRule] = DEFAULT_UNIT_RULES,
+        traversal_policy: Optional[TraversalPolicy] = None,
+    ):
+        self.processes = processes
+        # spawned, not forked: the parent runs threads (pipeline, pools) that a fork would copy mid-flight
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._manager = RateBudgetManager(ctx=self._mp_context)
+        self._manager.start()
+        self._budget = self._manager.TokenBucket(rate, burst)
+        self.rate_limiter = SharedTokenBucket(self._budget)
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=self._mp_context,
+            initializer=_init_shard,
+            initargs=(
+                api_key,
+                base_url,
+                self._budget,
+                sync_store_path,
+                max_workers,
+                keep_raw_blocks,
+                tuple(unit_rules),
+                traversal_policy,
+            ),
+        )
+
+    def iter_contexts(
+        self, context_ids: Iterable[_NotionID]
+    ) -> Iterator[Tuple[_NotionID, List[BlockRecord], List[BlockRecord]]]:
+        """(context_id, unit blocks, child pages to sync) per context, in completion order"""
+        futures = [self._executor.submit(_unfold_context, context_id) for context_id in context_ids]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._manager.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,155 @@
+import argparse
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Tuple
+from settings import _NotionID
+from record_utils import BlockRecord, TextRun
+from traversal_utils import ConcurrentUnfolder
+from extraction_utils import _ANNOTATION_BITS, _annotation_mask
+
+SNAPSHOT_VERSION = 1
+_ANNOTATIONS = tuple(_ANNOTATION_BITS.items())
+
+
+def _encode_run(run: TextRun) -> list:
+    """[plain_text, annotation mask, color, href], trailing defaults left out"""
+    encoded = [run.plain_text, _annotation_mask(run)]
+    if run.href is not None:
+        encoded += [run.color, run.href]
+    elif run.color != "default":
+        encoded.append(run.color)
+    return encoded
+
+
+def _decode_run(encoded: list) -> TextRun:
+    mask = encoded[1]
+    flags = {annotation: bool(mask & bit) for annotation, bit in _ANNOTATIONS}
+    color = encoded[2] if len(encoded) > 2 else "default"
+    href = encoded[3] if len(encoded) > 3 else None
+    return TextRun(encoded[0], color=color, href=href, **flags)
+
+
+class SnapshotWriter:
+    """
+    Writes a snapshot: one json array per block, (context_id, id, type, has_children, last_edited_time,
+    parent_page_id, runs), after a header line. Lines are gzip-compressed chunk_size at a time, each chunk its own
+    gzip member, so a snapshot cut short by a crash still reads back up to its last complete chunk.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 5000):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.blocks = 0
+        self._lines: List[str] = []
+        self._file = open(path, "wb")
+        header = {"snapshot": SNAPSHOT_VERSION, "created": datetime.now(timezone.utc).isoformat()}
+        self._lines.append(json.dumps(header))
+
+    def write(self, context_id: _NotionID, block: BlockRecord):
+        runs = [_encode_run(run) for run in block.rich_text]
+        row = [context_id, block.id, block.type, block.has_children, block.last_edited_time, block.parent_page_id, runs]
+        self._lines.append(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+        self.blocks += 1
+        if len(self._lines) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if self._lines:
+            self._file.write(gzip.compress(("\n".join(self._lines) + "\n").encode()))
+            self._lines = []
+
+    def close(self):
+        self._flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_snapshot(path: str) -> Iterator[Tuple[_NotionID, BlockRecord]]:
+    """(context_id, block) for every block of a snapshot, streamed from disk"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("snapshot") != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} snapshot.")
+        try:
+            for line in f:
+                context_id, block_id, block_type, has_children, last_edited_time, parent_page_id, runs = json.loads(line)
+                rich_text = tuple(_decode_run(run) for run in runs)
+                yield context_id, BlockRecord(
+                    block_id, block_type, has_children, last_edited_time, rich_text, parent_page_id
+                )
+        except EOFError:
+            # the last chunk was cut short; everything before it is intact
+            return
+
+
+def export_snapshot(pages_manager, context_ids: Iterable[_NotionID], path: str, chunk_size: int = 5000) -> int:
+    """
+    stream the whole tree of every context into a snapshot at path, child pages included whatever their sync state,
+    every block with its parent_page_id; return the number of blocks written. The file is written next to path and
+    moved in place once complete.
+    """
+    notion = pages_manager.notion_api_call
+    unfolder = ConcurrentUnfolder(
+        notion.get_block_records_page, lambda child_page: False, max_workers=pages_manager.max_workers
+    )
+    partial_path = path + ".partial"
+    with SnapshotWriter(partial_path, chunk_size) as writer:
+        for context_id in context_ids:
+            for block in unfolder.iter_unfold(context_id, []):
+                writer.write(context_id, block)
+    os.replace(partial_path, path)
+    return writer.blocks
+
+
+def extract_from_snapshot(pages_manager, path: str) -> Iterator[Tuple[BlockRecord, str]]:
+    """
+    (unit block, url) for every unit occurrence in a snapshot, through the manager's extract_units and
+    url_for_extracted_unit, without any request: a live run from an empty sync store finds the same unit blocks.
+    """
+    batch: List[BlockRecord] = []
+    for _, block in iter_snapshot(path):
+        batch.append(block)
+        if len(batch) == 1000:
+            yield from _extract_batch(pages_manager, batch)
+            batch = []
+    yield from _extract_batch(pages_manager, batch)
+
+
+def _extract_batch(pages_manager, blocks: List[BlockRecord]) -> Iterator[Tuple[BlockRecord, str]]:
+    for unit_block in pages_manager.extract_units(blocks):
+        yield unit_block, pages_manager.url_for_extracted_unit(unit_block)
+
+
+if __name__ == "__main__":
+    from notion_api_utils import CEPagesManager
+    from main import SyntheticOperation
+
+    parser = argparse.ArgumentParser(description="Snapshot the context trees, or extract units from a snapshot.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write every context tree to a snapshot (reads Notion)")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--chunk-size", type=int, default=5000, help="blocks per compressed chunk")
+    extract_parser = commands.add_parser("extract", help="list the unit occurrences in a snapshot (offline)")
+    extract_parser.add_argument("path")
+    extract_parser.add_argument("--json", action="store_true", help="one json object per occurrence")
+    args = parser.parse_args()
+    if args.command == "export":
+        pages = CEPagesManager(os.environ["NOTION_KEY"])
+        contexts = pages.get_contexts_from_database(SyntheticOperation.MAINDATABASE_ID)
+        written = export_snapshot(pages, [context["id"] for context in contexts], args.path, args.chunk_size)
+        print(f"{written} blocks from {len(contexts)} contexts written to {args.path}")
+    else:
+        # offline: the manager is only used for extraction and urls, so no key is needed and no request is sent
+        pages = CEPagesManager(os.environ.get("NOTION_KEY", "offline"))
+        for unit_block, url in extract_from_snapshot(pages, args.path):
+            if args.json:
+                print(json.dumps({"unit": unit_block.unit, "block_id": unit_block.id, "url": url}, ensure_ascii=False))
+            else:
+                print(f"{unit_block.unit}\t{url}")
@@ -0,0 +1,540 @@
+import difflib
+import json
+import re
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from settings import _NotionID
+
+
+class _SQLiteStore:
+    """Thread-safe SQLite connection in autocommit mode; subclasses declare their tables in SCHEMA."""
+
+    SCHEMA: str = ""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SyncStateStore(_SQLiteStore):
+    """
+    Local record of each page's last seen last_edited_time and its extraction watermark, so the sync state of a
+    child page can be decided from the block-children listing alone instead of a get_page per page.
+    An empty last_extracted_time means the page is known and was never extracted; no row means unknown.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sync_state (
+            page_id TEXT PRIMARY KEY,
+            last_edited_time TEXT NOT NULL DEFAULT '',
+            last_extracted_time TEXT NOT NULL DEFAULT ''
+        );
+    """
+
+    def last_extracted_time(self, page_id: _NotionID) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_extracted_time FROM sync_state WHERE page_id = ?", (page_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def last_edited_time(self, page_id: _NotionID) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT last_edited_time FROM sync_state WHERE page_id = ?", (page_id,)).fetchone()
+        return row[0] if row else None
+
+    def record(self, page_id: _NotionID, last_edited_time: str, last_extracted_time: str):
+        """store both timestamps, e.g. as read from the page properties"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (page_id, last_edited_time, last_extracted_time) VALUES (?, ?, ?)",
+                (page_id, last_edited_time or "", last_extracted_time or ""),
+            )
+
+    def observe(self, page_id: _NotionID, last_edited_time: str):
+        """update the last seen edit time of a known page, leaving its extraction watermark untouched"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE sync_state SET last_edited_time = ? WHERE page_id = ?", (last_edited_time or "", page_id)
+            )
+
+    def mark_extracted(self, page_id: _NotionID, last_extracted_time: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sync_state (page_id, last_extracted_time) VALUES (?, ?) "
+                "ON CONFLICT(page_id) DO UPDATE SET last_extracted_time = excluded.last_extracted_time",
+                (page_id, last_extracted_time),
+            )
+
+
+class RunJournal(_SQLiteStore):
+    """
+    Durable checkpoints of one refresh run, so an interrupted run can be resumed instead of redone:
+    - contexts whose traversal completed, with the unit occurrences found in them and whether each was appended;
+    - child pages waiting for their extraction time update, which only happens once the run's appends are done.
+    A resumed run replays the unappended occurrences of traversed contexts without fetching them again, re-traverses
+    the other contexts skipping occurrences already appended, and then updates the pending pages.
+    An occurrence counts as appended once its write is queued; a write that fails marks it unappended again, and the
+    pages of unappended occurrences are kept pending.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS traversed_contexts (
+            context_id TEXT PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS occurrences (
+            block_id TEXT NOT NULL,
+            unit TEXT NOT NULL,
+            block_type TEXT NOT NULL,
+            parent_page_id TEXT NOT NULL,
+            context_id TEXT NOT NULL,
+            appended INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (block_id, unit)
+        );
+        CREATE TABLE IF NOT EXISTS pending_pages (
+            page_id TEXT PRIMARY KEY,
+            context_id TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        # checkpoints only need to survive the process, not the OS; WAL + NORMAL skips an fsync per commit
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    def _write_many(self, statement: str, rows: Iterable[tuple]):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(statement, rows)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return not any(
+                self._conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+                for table in ("traversed_contexts", "occurrences", "pending_pages")
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.executescript(
+                "BEGIN; DELETE FROM traversed_contexts; DELETE FROM occurrences; DELETE FROM pending_pages; COMMIT;"
+            )
+
+    def traversed_contexts(self) -> Set[_NotionID]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT context_id FROM traversed_contexts")}
+
+    def mark_traversed(self, context_id: _NotionID, pending_page_ids: Iterable[_NotionID]):
+        """checkpoint a context whose traversal completed, with the child pages it found out of sync"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO pending_pages (page_id, context_id) VALUES (?, ?)",
+                [(page_id, context_id) for page_id in pending_page_ids],
+            )
+            self._conn.execute("INSERT OR IGNORE INTO traversed_contexts (context_id) VALUES (?)", (context_id,))
+            self._conn.execute("COMMIT")
+
+    def appended_occurrences(self) -> Set[Tuple[_NotionID, str]]:
+        with self._lock:
+            return {tuple(row) for row in self._conn.execute("SELECT block_id, unit FROM occurrences WHERE appended")}
+
+    def add_occurrence(
+        self, context_id: _NotionID, block_id: _NotionID, unit: str, block_type: str, parent_page_id: _NotionID
+    ):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO occurrences (block_id, unit, block_type, parent_page_id, context_id) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (block_id, unit, block_type, parent_page_id, context_id),
+            )
+
+    def mark_appended(self, occurrences: Iterable[Tuple[_NotionID, str]]):
+        self._write_many("UPDATE occurrences SET appended = 1 WHERE block_id = ? AND unit = ?", occurrences)
+
+    def mark_unappended(self, occurrences: Iterable[Tuple[_NotionID, str]]):
+        """take back occurrences marked appended whose write failed, so a resumed run sends them again"""
+        self._write_many("UPDATE occurrences SET appended = 0 WHERE block_id = ? AND unit = ?", occurrences)
+
+    def unappended_occurrences(self, context_id: _NotionID) -> List[Tuple[_NotionID, str, str, _NotionID]]:
+        """(block_id, unit, block_type, parent_page_id) of the occurrences of a context still to be appended"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT block_id, unit, block_type, parent_page_id FROM occurrences "
+                "WHERE context_id = ? AND NOT appended",
+                (context_id,),
+            ).fetchall()
+
+    def unappended_pages(self) -> Set[_NotionID]:
+        """pages holding an occurrence still to be appended: their extraction time must not be updated yet"""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT parent_page_id FROM occurrences WHERE NOT appended")
+            return {row[0] for row in rows}
+
+    def pending_pages(self) -> List[_NotionID]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT page_id FROM pending_pages")]
+
+    def clear_pending_page(self, page_id: _NotionID):
+        with self._lock:
+            self._conn.execute("DELETE FROM pending_pages WHERE page_id = ?", (page_id,))
+
+
+class Occurrence(NamedTuple):
+    unit: str
+    block_id: _NotionID
+    parent_page_id: _NotionID
+    context_id: _NotionID
+    url: str
+    text: str
+
+
+class OccurrenceIndex(_SQLiteStore):
+    """
+    Local inverted index from each unit to its occurrences: the block it was marked in, the page and context holding
+    that block, its url (url_for_extracted_unit) and the block's text, so "where did I see this" is answered without
+    opening Notion. Units and texts are full-text indexed (FTS5, prefix indexes of 2 and 3 characters).
+    A refresh run replaces the occurrences of every page it traversed, so occurrences removed from a page leave the
+    index with the next run that extracts that page again.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS occurrences (
+            id INTEGER PRIMARY KEY,
+            unit TEXT NOT NULL,
+            block_id TEXT NOT NULL,
+            parent_page_id TEXT NOT NULL,
+            context_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            text TEXT NOT NULL,
+            UNIQUE (block_id, unit)
+        );
+        CREATE INDEX IF NOT EXISTS occurrences_unit ON occurrences (unit COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS occurrences_page ON occurrences (parent_page_id);
+        CREATE VIRTUAL TABLE IF NOT EXISTS occurrence_search USING fts5 (
+            unit, text, content='occurrences', content_rowid='id', prefix='2 3',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS occurrences_insert AFTER INSERT ON occurrences BEGIN
+            INSERT INTO occurrence_search (rowid, unit, text) VALUES (new.id, new.unit, new.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS occurrences_delete AFTER DELETE ON occurrences BEGIN
+            INSERT INTO occurrence_search (occurrence_search, rowid, unit, text)
+            VALUES ('delete', old.id, old.unit, old.text);
+        END;
+    """
+    _COLUMNS = "unit, block_id, parent_page_id, context_id, url, text"
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        # derived data, rebuilt by the next runs if lost with the OS
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    def replace_pages(self, page_ids: Iterable[_NotionID], occurrences: Iterable[Occurrence]):
+        """the occurrences now found in the given pages, in place of whatever was indexed for them"""
+        page_ids = [(page_id,) for page_id in page_ids]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("DELETE FROM occurrences WHERE parent_page_id = ?", page_ids)
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO occurrences ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", occurrences
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def lookup(self, unit: str) -> List[Occurrence]:
+        """every occurrence of a unit, case-insensitive"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM occurrences WHERE unit = ? COLLATE NOCASE ORDER BY context_id, id",
+                (unit,),
+            ).fetchall()
+        return [Occurrence(*row) for row in rows]
+
+    def search(self, query: str, limit: int = 20, in_text: bool = False) -> List[Occurrence]:
+        """
+        occurrences of the units starting with the words of query ("tak of" finds "take off"), best matches first;
+        with in_text the surrounding texts are searched as well
+        """
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        match = " ".join(f'"{term}"*' for term in terms)
+        if not in_text:
+            match = f"unit : ({match})"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join('o.' + column for column in self._COLUMNS.split(', '))} "
+                "FROM occurrence_search JOIN occurrences o ON o.id = occurrence_search.rowid "
+                "WHERE occurrence_search MATCH ? ORDER BY bm25(occurrence_search) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [Occurrence(*row) for row in rows]
+
+    def fuzzy(self, query: str, limit: int = 10, cutoff: float = 0.75) -> List[Tuple[str, int]]:
+        """(unit, number of occurrences) of the units spelled closest to query, for lookups with a typo"""
+        query = query.lower()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT lower(unit), COUNT(*) FROM occurrences GROUP BY unit COLLATE NOCASE"
+            ).fetchall()
+        # a unit whose length differs too much cannot reach the cutoff; skipping it keeps difflib's work small
+        slack = 2 * len(query) * (1 - cutoff) / cutoff
+        counts = {unit: count for unit, count in rows if abs(len(unit) - len(query)) <= slack}
+        matches = difflib.get_close_matches(query, counts, n=limit, cutoff=cutoff)
+        return [(unit, counts[unit]) for unit in matches]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM occurrences").fetchone()[0]
+
+
+class PendingWrite(NamedTuple):
+    id: int
+    kind: str
+    target: str
+    payload: Dict[str, Any]
+    meta: Dict[str, Any]
+    attempts: int
+
+
+class WriteQueueStore(_SQLiteStore):
+    """
+    Durable queue of the mutations waiting to be sent to Notion (see write_utils.WriteBehind).
+    Writes to one target run in the order they were queued, one at a time. A page still to be created is known by a
+    placeholder id; the writes queued against it wait for its creation and are sent to the real id afterwards.
+    Writes are coalesced as they are queued, as long as the write they merge into has not been claimed:
+    - a property update merges into the target's pending update;
+    - an append joins the target's pending append, or else the children of its pending creation, up to
+      children_per_request children in either.
+    Metadata is merged along: lists are concatenated, other values replaced.
+    Writes in flight when the process stopped are pending again on reopening, so a write is delivered at least once.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS writes (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            target TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            meta TEXT NOT NULL DEFAULT '{}',
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS writes_target ON writes (target, id);
+        CREATE TABLE IF NOT EXISTS placeholders (
+            placeholder TEXT PRIMARY KEY,
+            database_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            page_id TEXT,
+            UNIQUE (database_id, title)
+        );
+    """
+
+    def __init__(self, path: str, children_per_request: int):
+        super().__init__(path)
+        # most children one request carries: the CHILDREN_PER_REQUEST of the client sending the writes
+        self.children_per_request = children_per_request
+        with self._lock:
+            self._conn.execute("UPDATE writes SET state = 'pending' WHERE state = 'inflight'")
+
+    def _transaction(self):
+        """caller holds the lock"""
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    @staticmethod
+    def _merge_meta(meta: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+        merged = dict(meta)
+        for key, value in update.items():
+            if isinstance(value, list) and isinstance(merged.get(key), list):
+                merged[key] = merged[key] + value
+            else:
+                merged[key] = value
+        return merged
+
+    def _pending(self, target: str, kind: str) -> Optional[Tuple[int, Dict[str, Any], Dict[str, Any]]]:
+        """(id, payload, meta) of the last unclaimed write of that kind to target; caller holds the lock"""
+        row = self._conn.execute(
+            "SELECT id, payload, meta FROM writes WHERE target = ? AND kind = ? AND state = 'pending' "
+            "ORDER BY id DESC LIMIT 1",
+            (target, kind),
+        ).fetchone()
+        return (row[0], json.loads(row[1]), json.loads(row[2])) if row else None
+
+    def _insert(self, kind: str, target: str, payload: Dict[str, Any], meta: Dict[str, Any]):
+        self._conn.execute(
+            "INSERT INTO writes (kind, target, payload, meta) VALUES (?, ?, ?, ?)",
+            (kind, target, json.dumps(payload), json.dumps(meta)),
+        )
+
+    def _replace(self, write_id: int, payload: Dict[str, Any], meta: Dict[str, Any]):
+        self._conn.execute(
+            "UPDATE writes SET payload = ?, meta = ? WHERE id = ?", (json.dumps(payload), json.dumps(meta), write_id)
+        )
+
+    def enqueue_create(
+        self,
+        database_id: _NotionID,
+        title: str,
+        properties: Dict[str, Any],
+        children: List[Dict[str, Any]],
+        meta: Dict[str, Any],
+    ) -> str:
+        """
+        queue the creation of a page titled title; return the placeholder id standing for it until it exists.
+        children beyond children_per_request are queued as appends to the placeholder, so a failed chunk is retried
+        on its own and never sends the creation again.
+        """
+        placeholder = f"pending-{uuid.uuid4().hex}"
+        step = self.children_per_request
+        payload = {"database_id": database_id, "properties": properties, "children": children[:step]}
+        with self._lock:
+            self._transaction()
+            self._conn.execute(
+                "INSERT INTO placeholders (placeholder, database_id, title) VALUES (?, ?, ?)",
+                (placeholder, database_id, title),
+            )
+            self._insert("create", placeholder, payload, meta)
+            for start in range(step, len(children), step):
+                self._insert("append", placeholder, {"children": children[start : start + step]}, {})
+            self._conn.execute("COMMIT")
+        return placeholder
+
+    def enqueue_append(self, target: str, children: List[Dict[str, Any]], meta: Dict[str, Any]):
+        with self._lock:
+            self._transaction()
+            # the last pending write to the target, if it has room: children stay in the order they were queued
+            pending = self._pending(target, "append") or self._pending(target, "create")
+            if pending is not None and len(pending[1]["children"]) + len(children) <= self.children_per_request:
+                write_id, payload, pending_meta = pending
+                payload["children"] = payload["children"] + children
+                self._replace(write_id, payload, self._merge_meta(pending_meta, meta))
+            else:
+                self._insert("append", target, {"children": children}, meta)
+            self._conn.execute("COMMIT")
+
+    def enqueue_update(self, target: str, properties: Dict[str, Any], meta: Dict[str, Any]):
+        with self._lock:
+            self._transaction()
+            update = self._pending(target, "update")
+            if update is not None:
+                write_id, payload, update_meta = update
+                payload["properties"] = {**payload["properties"], **properties}
+                self._replace(write_id, payload, self._merge_meta(update_meta, meta))
+            else:
+                self._insert("update", target, {"properties": properties}, meta)
+            self._conn.execute("COMMIT")
+
+    def claim(self) -> Optional[PendingWrite]:
+        """
+        mark the oldest write that can be sent now as in flight and return it, its target resolved to the real page
+        id; None when every pending write waits behind an earlier write to the same target
+        """
+        with self._lock:
+            self._transaction()
+            row = self._conn.execute(
+                "SELECT w.id, w.kind, w.target, w.payload, w.meta, w.attempts FROM writes w "
+                "WHERE w.state = 'pending' AND NOT EXISTS ("
+                "    SELECT 1 FROM writes e WHERE e.target = w.target AND e.id < w.id AND e.state != 'failed'"
+                ") ORDER BY w.id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+            self._conn.execute("UPDATE writes SET state = 'inflight' WHERE id = ?", (row[0],))
+            self._conn.execute("COMMIT")
+            target = row[2]
+            if row[1] != "create" and target.startswith("pending-"):
+                resolved = self._conn.execute(
+                    "SELECT page_id FROM placeholders WHERE placeholder = ?", (target,)
+                ).fetchone()
+                target = resolved[0] if resolved and resolved[0] else target
+        return PendingWrite(row[0], row[1], target, json.loads(row[3]), json.loads(row[4]), row[5])
+
+    def complete(self, write: PendingWrite, page_id: Optional[_NotionID] = None):
+        """drop a delivered write; page_id is the id of the page a create write made"""
+        with self._lock:
+            self._transaction()
+            if write.kind == "create":
+                self._conn.execute(
+                    "UPDATE placeholders SET page_id = ? WHERE placeholder = ?", (page_id, write.target)
+                )
+            self._conn.execute("DELETE FROM writes WHERE id = ?", (write.id,))
+            self._conn.execute("COMMIT")
+
+    def retry(self, write: PendingWrite, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE writes SET state = 'pending', attempts = attempts + 1, error = ? WHERE id = ?",
+                (error, write.id),
+            )
+
+    def fail(self, write: PendingWrite, error: str):
+        """
+        give up on a write; when it is a creation, the writes queued against its placeholder fail with it and the
+        title is free to be created again by a later run
+        """
+        with self._lock:
+            self._transaction()
+            self._conn.execute("UPDATE writes SET state = 'failed', error = ? WHERE id = ?", (error, write.id))
+            if write.kind == "create":
+                self._conn.execute(
+                    "UPDATE writes SET state = 'failed', error = ? WHERE target = ? AND state = 'pending'",
+                    (f"the page could not be created: {error}", write.target),
+                )
+                self._conn.execute("DELETE FROM placeholders WHERE placeholder = ?", (write.target,))
+            self._conn.execute("COMMIT")
+
+    def page_for(self, database_id: _NotionID, title: str) -> Optional[str]:
+        """the page queued for creation under that title: its id once created, its placeholder until then"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT placeholder, page_id FROM placeholders WHERE database_id = ? AND title = ?",
+                (database_id, title),
+            ).fetchone()
+        return (row[1] or row[0]) if row else None
+
+    def unsent(self) -> int:
+        """writes pending or in flight"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM writes WHERE state != 'failed'").fetchone()[0]
+
+    def failures(self) -> List[Tuple[PendingWrite, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, target, payload, meta, attempts, error FROM writes WHERE state = 'failed' ORDER BY id"
+            ).fetchall()
+        return [
+            (PendingWrite(row[0], row[1], row[2], json.loads(row[3]), json.loads(row[4]), row[5]), row[6])
+            for row in rows
+        ]
+
+    def clear_failures(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM writes WHERE state = 'failed'")
+
+    def prune(self):
+        """forget the placeholders of created pages no queued write refers to anymore"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM placeholders WHERE page_id IS NOT NULL "
+                "AND NOT EXISTS (SELECT 1 FROM writes WHERE writes.target = placeholders.placeholder)"
+            )
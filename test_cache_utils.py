@@ -0,0 +1,156 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_utils import DiskCache, LRUCache
+
+
+class BlockingLoader:
+    """loader that blocks until released, counting its calls"""
+
+    def __init__(self, value=None):
+        self.value = value
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value if self.value is not None else object()
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.005)
+
+
+class GetOrLoadTest(unittest.TestCase):
+    THREADS = 16
+
+    def test_concurrent_loads_share_one_call(self):
+        cache = LRUCache()
+        loader = BlockingLoader()
+        with ThreadPoolExecutor(self.THREADS) as pool:
+            results = [pool.submit(cache.get_or_load, "key", loader) for _ in range(self.THREADS)]
+            # every caller is waiting on the one in-flight load before it is let through
+            wait_until(lambda: cache.stats()["coalesced"] == self.THREADS - 1)
+            loader.release.set()
+            values = [result.result(5) for result in results]
+        self.assertEqual(loader.calls, 1)
+        self.assertTrue(all(value is values[0] for value in values))
+        self.assertIs(cache.get("key"), values[0])
+        stats = cache.stats()
+        self.assertEqual((stats["misses"], stats["coalesced"]), (1, self.THREADS - 1))
+
+    def test_failed_load_reaches_every_caller_and_is_not_cached(self):
+        cache = LRUCache()
+        loader = BlockingLoader(ValueError("lookup failed"))
+        with ThreadPoolExecutor(4) as pool:
+            results = [pool.submit(cache.get_or_load, "key", loader) for _ in range(4)]
+            wait_until(lambda: cache.stats()["coalesced"] == 3)
+            loader.release.set()
+            for result in results:
+                with self.assertRaises(ValueError):
+                    result.result(5)
+        self.assertEqual(loader.calls, 1)
+        self.assertEqual(cache.get_or_load("key", lambda: "loaded"), "loaded")
+
+    def test_invalidate_during_load_drops_the_stale_value(self):
+        cache = LRUCache()
+        stale = BlockingLoader("stale")
+        with ThreadPoolExecutor(1) as pool:
+            loading = pool.submit(cache.get_or_load, "key", stale)
+            self.assertTrue(stale.started.wait(5))
+            cache.invalidate("key")
+            # a caller after the invalidation does not wait on the stale load
+            self.assertEqual(cache.get_or_load("key", lambda: "fresh"), "fresh")
+            stale.release.set()
+            self.assertEqual(loading.result(5), "stale")
+        self.assertEqual(cache.get("key"), "fresh")
+        self.assertEqual(stale.calls, 1)
+
+    def test_invalidate_during_load_stores_nothing(self):
+        cache = LRUCache()
+        loader = BlockingLoader("stale")
+        with ThreadPoolExecutor(1) as pool:
+            loading = pool.submit(cache.get_or_load, "key", loader)
+            self.assertTrue(loader.started.wait(5))
+            cache.invalidate("key")
+            loader.release.set()
+            loading.result(5)
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.get_or_load("key", lambda: "reloaded"), "reloaded")
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.state_dir.name, "cache.sqlite3")
+        self.cache = DiskCache(self.path, max_entries=3)
+
+    def tearDown(self):
+        self.cache.close()
+        self.state_dir.cleanup()
+
+    def test_evicts_least_recently_used(self):
+        for key in "abc":
+            self.cache.put(key, key)
+        self.cache.get("a")
+        self.cache.put("d", "d")
+        self.assertEqual(len(self.cache), 3)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual([self.cache.get(key) for key in "acd"], ["a", "c", "d"])
+
+    def test_replace_and_delete_keep_the_count(self):
+        for key in "abc":
+            self.cache.put(key, key)
+        # rewriting an entry does not make room by evicting another
+        self.cache.put("a", "again")
+        self.assertEqual(len(self.cache), 3)
+        self.cache.delete("b")
+        self.cache.delete("b")
+        self.cache.put("d", "d")
+        self.assertEqual([self.cache.get(key) for key in "acd"], ["again", "c", "d"])
+
+    def test_expired_entries_leave_the_count(self):
+        for key in "abc":
+            self.cache.put(key, key, ttl=-10)
+        self.assertEqual([self.cache.get(key) for key in "abc"], [None, None, None])
+        for key in "def":
+            self.cache.put(key, key)
+        self.assertEqual([self.cache.get(key) for key in "def"], ["d", "e", "f"])
+
+    def test_count_survives_reopening(self):
+        for key in "abc":
+            self.cache.put(key, key)
+        self.cache.close()
+        self.cache = DiskCache(self.path, max_entries=3)
+        self.cache.put("d", "d")
+        self.assertEqual(len(self.cache), 3)
+        self.assertIsNone(self.cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import unittest
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import requests
+
+import http_utils
+from http_utils import RetryPolicy, TokenBucket
+from notion_api_utils import NotionAPI, NotionAPIError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def response(status: int, retry_after: str = None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = b'{"object": "page", "id": "page"}' if status == 200 else b'{"object": "error"}'
+    if retry_after is not None:
+        resp.headers["Retry-After"] = retry_after
+    return resp
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(http_utils.time, "monotonic", self.clock.monotonic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bucket = TokenBucket(rate=2.0, burst=3)
+
+    def test_burst_then_rate(self):
+        self.assertEqual([self.bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        # borrowed from the future: one token every 1 / rate seconds
+        self.assertAlmostEqual(self.bucket.reserve(), 0.5)
+        self.assertAlmostEqual(self.bucket.reserve(), 1.0)
+
+    def test_refills_up_to_burst(self):
+        for _ in range(3):
+            self.bucket.reserve()
+        self.clock.now += 60
+        self.assertEqual([self.bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(self.bucket.reserve(), 0.5)
+
+    def test_try_acquire_never_borrows(self):
+        self.assertTrue(all(self.bucket.try_acquire() for _ in range(3)))
+        self.assertFalse(self.bucket.try_acquire())
+        self.clock.now += 0.5
+        self.assertTrue(self.bucket.try_acquire())
+
+    def test_pause_holds_every_caller(self):
+        self.bucket.pause(5.0)
+        self.assertAlmostEqual(self.bucket.reserve(), 5.0)
+        self.assertFalse(self.bucket.try_acquire())
+        # a shorter pause never shortens a longer one
+        self.bucket.pause(1.0)
+        self.clock.now += 2
+        self.assertAlmostEqual(self.bucket.reserve(), 3.0)
+        self.clock.now += 3
+        self.assertTrue(self.bucket.try_acquire())
+
+
+class RetryPolicyTest(unittest.TestCase):
+    # (idempotent, status or None for a connection error/timeout, retried)
+    CASES = [
+        (True, 429, True),
+        (True, 500, True),
+        (True, 502, True),
+        (True, 503, True),
+        (True, 504, True),
+        (True, None, True),
+        (True, 400, False),
+        (True, 404, False),
+        (True, 200, False),
+        (False, 429, True),
+        (False, 500, False),
+        (False, 502, False),
+        (False, 503, False),
+        (False, 504, False),
+        (False, None, False),
+        (False, 400, False),
+        (False, 200, False),
+    ]
+
+    def test_should_retry(self):
+        policy = RetryPolicy(max_retries=3)
+        for idempotent, status, retried in self.CASES:
+            with self.subTest(idempotent=idempotent, status=status):
+                resp = response(status) if status is not None else None
+                self.assertEqual(policy.should_retry(0, resp, idempotent), retried)
+
+    def test_gives_up_after_max_retries(self):
+        policy = RetryPolicy(max_retries=3)
+        self.assertTrue(policy.should_retry(2, response(429), idempotent=False))
+        self.assertFalse(policy.should_retry(3, response(429), idempotent=False))
+        self.assertFalse(policy.should_retry(3, None, idempotent=True))
+
+    def test_retry_after(self):
+        self.assertEqual(RetryPolicy.retry_after(response(429, "7")), 7.0)
+        self.assertEqual(RetryPolicy.retry_after(response(429, "-3")), 0.0)
+        self.assertIsNone(RetryPolicy.retry_after(response(429)))
+        self.assertIsNone(RetryPolicy.retry_after(response(429, "soon")))
+        later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        self.assertAlmostEqual(RetryPolicy.retry_after(response(429, later)), 30, delta=2)
+
+    def test_delay_is_at_least_retry_after(self):
+        policy = RetryPolicy(base_delay=0.5, max_delay=60)
+        for attempt in range(5):
+            self.assertGreaterEqual(policy.delay(attempt, response(429, "4")), 4.0)
+            self.assertLessEqual(policy.delay(attempt), min(60, 0.5 * 2**attempt))
+
+
+class ScriptedTransport:
+    """answers each request with the next of the given responses"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.methods = []
+
+    def request(self, method, url, **kwargs):
+        self.methods.append(method)
+        return self.responses.pop(0)
+
+
+class NotionRetryTest(unittest.TestCase):
+    """the client applies RetryPolicy per method: a page creation is never sent again after a 5xx"""
+
+    def client(self, *responses) -> NotionAPI:
+        transport = ScriptedTransport(*responses)
+        notion = NotionAPI("key", transport=transport, rate_limiter=TokenBucket(1000.0, 100))
+        notion.retry_policy = RetryPolicy(base_delay=0.0)
+        return notion
+
+    def setUp(self):
+        patcher = mock.patch("notion_api_utils.time.sleep")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_create_is_not_resent_after_5xx(self):
+        notion = self.client(response(502), response(200))
+        with self.assertRaises(NotionAPIError) as raised:
+            notion.create_page("db", {}, [])
+        self.assertEqual(raised.exception.status_code, 502)
+        self.assertEqual(notion.transport.methods, ["POST"])
+
+    def test_create_is_resent_after_429_and_pauses_the_bucket(self):
+        notion = self.client(response(429, "2"), response(200))
+        with mock.patch.object(notion.rate_limiter, "pause") as pause:
+            self.assertEqual(notion.create_page("db", {}, [])["id"], "page")
+        self.assertEqual(notion.transport.methods, ["POST", "POST"])
+        self.assertGreaterEqual(pause.call_args[0][0], 2.0)
+
+    def test_get_is_resent_after_5xx(self):
+        notion = self.client(response(503), response(200))
+        self.assertEqual(notion.get_page("page")["id"], "page")
+        self.assertEqual(notion.transport.methods, ["GET", "GET"])
+
+
+if __name__ == "__main__":
+    unittest.main()
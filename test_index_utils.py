@@ -0,0 +1,122 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+from index_utils import UnitIndex, UnitIndexError
+
+DATABASE_ID = "db0000000000000000000000000000aa"
+
+
+def page(page_id: str, title: str, archived: bool = False) -> dict:
+    return {
+        "id": page_id,
+        "archived": archived,
+        "properties": {"Name": {"type": "title", "title": [{"plain_text": title}]}},
+    }
+
+
+class StubNotion:
+    """answers query_database with the pages set for the next call, and records the filters it was given"""
+
+    def __init__(self):
+        self.pages = []
+        self.filters = []
+
+    def query_database(self, database_id, filter=None, page_size=100):
+        self.filters.append(filter)
+        pages, self.pages = self.pages, []
+        return pages
+
+
+class UnitIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.state_dir.name, "index.json")
+        self.index = UnitIndex(self.path)
+        self.notion = StubNotion()
+        self.notion.pages = [page("p1", "alpha"), page("p2", "beta")]
+        self.assertEqual(self.index.refresh(self.notion, DATABASE_ID), 2)
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def age_full_scan(self):
+        """make the last full scan FULL_SCAN_INTERVAL old"""
+        database = self.index._databases[DATABASE_ID]
+        last = datetime.fromisoformat(database["full_scan"]) - UnitIndex.FULL_SCAN_INTERVAL
+        database["full_scan"] = last.isoformat()
+
+    def test_first_refresh_is_a_full_scan(self):
+        self.assertEqual(self.notion.filters, [None])
+        self.assertEqual(self.index.lookup(DATABASE_ID, "alpha"), "p1")
+        self.assertEqual(self.index.lookup(DATABASE_ID, "beta"), "p2")
+        self.assertIsNone(self.index.lookup(DATABASE_ID, "gamma"))
+
+    def test_incremental_refresh_queries_past_the_watermark(self):
+        watermark = self.index._databases[DATABASE_ID]["watermark"]
+        self.notion.pages = [page("p2", "beta renamed"), page("p3", "gamma")]
+        self.assertEqual(self.index.refresh(self.notion, DATABASE_ID), 2)
+        self.assertEqual(
+            self.notion.filters[-1],
+            {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": watermark}},
+        )
+        # pages not returned are kept, edited ones move to their new title
+        self.assertEqual(self.index.lookup(DATABASE_ID, "alpha"), "p1")
+        self.assertIsNone(self.index.lookup(DATABASE_ID, "beta"))
+        self.assertEqual(self.index.lookup(DATABASE_ID, "beta renamed"), "p2")
+        self.assertEqual(self.index.lookup(DATABASE_ID, "gamma"), "p3")
+        self.assertLess(datetime.fromisoformat(watermark), datetime.now(timezone.utc))
+
+    def test_incremental_refresh_keeps_pages_it_cannot_see_go(self):
+        # a deleted page is simply absent from the query: only a full scan drops it
+        self.index.refresh(self.notion, DATABASE_ID)
+        self.assertEqual(self.index.lookup(DATABASE_ID, "beta"), "p2")
+
+    def test_full_scan_when_due(self):
+        self.age_full_scan()
+        self.notion.pages = [page("p1", "alpha")]
+        self.index.refresh(self.notion, DATABASE_ID)
+        self.assertIsNone(self.notion.filters[-1])
+        self.assertEqual(self.index.lookup(DATABASE_ID, "alpha"), "p1")
+        self.assertIsNone(self.index.lookup(DATABASE_ID, "beta"))
+        # and not again until the next interval
+        self.index.refresh(self.notion, DATABASE_ID)
+        self.assertIsNotNone(self.notion.filters[-1])
+
+    def test_full_scan_when_asked(self):
+        self.notion.pages = [page("p2", "beta")]
+        self.index.refresh(self.notion, DATABASE_ID, full=True)
+        self.assertIsNone(self.notion.filters[-1])
+        self.assertIsNone(self.index.lookup(DATABASE_ID, "alpha"))
+
+    def test_archived_page_is_dropped(self):
+        self.notion.pages = [page("p1", "alpha", archived=True)]
+        self.index.refresh(self.notion, DATABASE_ID)
+        self.assertIsNone(self.index.lookup(DATABASE_ID, "alpha"))
+        self.assertNotIn("p1", self.index._databases[DATABASE_ID]["pages"])
+
+    def test_remove(self):
+        self.assertTrue(self.index.remove("p-1"))
+        self.assertIsNone(self.index.lookup(DATABASE_ID, "alpha"))
+        self.assertEqual(self.index.lookup(DATABASE_ID, "beta"), "p2")
+        self.assertFalse(self.index.remove("p1"))
+        self.assertFalse(self.index.remove("unknown"))
+
+    def test_duplicate_titles(self):
+        self.index.add(DATABASE_ID, page("p3", "alpha"))
+        with self.assertRaises(UnitIndexError):
+            self.index.lookup(DATABASE_ID, "alpha")
+        self.index.remove("p3")
+        self.assertEqual(self.index.lookup(DATABASE_ID, "alpha"), "p1")
+
+    def test_saved_index_keeps_the_full_scan_time(self):
+        self.index.save()
+        index = UnitIndex(self.path)
+        self.assertEqual(index.lookup(DATABASE_ID, "alpha"), "p1")
+        index.refresh(self.notion, DATABASE_ID)
+        self.assertIsNotNone(self.notion.filters[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
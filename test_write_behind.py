@@ -0,0 +1,182 @@
+import os
+import tempfile
+import time
+import unittest
+
+os.environ.setdefault("NOTION_KEY", "mock-notion-key")
+os.environ.setdefault("MERRIAM_WEBSTER_KEY", "mock-mw-key")
+
+from http_utils import TokenBucket
+from main import SyntheticOperation
+from mock_server import MockServer, generate_workspace
+from notion_api_utils import NotionAPI, NotionAPIError
+from store_utils import WriteQueueStore
+from write_utils import WriteBehind
+
+CREATE_ROUTE = "POST /v1/pages"
+APPEND_ROUTE = "PATCH /v1/blocks/{id}/children"
+
+
+class FailedWritesResumeTest(unittest.TestCase):
+    """writes the queue gives up on are sent again by --resume, and their pages are not marked extracted meanwhile"""
+
+    def setUp(self):
+        self.workspace = generate_workspace(
+            SyntheticOperation.MAINDATABASE_ID,
+            SyntheticOperation.WORDDATABASE_ID,
+            SyntheticOperation.EXPRDATABASE_ID,
+            contexts=3,
+            breadth=10,
+            depth=3,
+            unit_density=0.5,
+            subpage_ratio=0.3,
+            vocabulary=40,
+            seed=1,
+        )
+        self.server = MockServer(self.workspace).start()
+        self.cwd = os.getcwd()
+        self.state_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.state_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.state_dir.cleanup()
+        self.server.stop()
+
+    def operation(self) -> SyntheticOperation:
+        operation = SyntheticOperation()
+        notion = operation.CEpages.notion_api_call
+        notion.BASE_URL = self.server.notion_base_url
+        notion.rate_limiter = TokenBucket(1000.0, 100)
+        notion.retry_policy.base_delay = 0.01
+        operation.WMapi.BASE_URL = self.server.mw_base_url
+        operation.WMapi.rate_limiter = TokenBucket(1000.0, 100)
+        return operation
+
+    def extracted_pages(self):
+        return {
+            page_id
+            for page_id, page in self.workspace.pages.items()
+            if (page["properties"].get("Last extracted time") or {}).get("date")
+        }
+
+    def child_pages(self):
+        """the pages below the contexts, the ones a run marks extracted"""
+        return {page_id for page_id, page in self.workspace.pages.items() if "page_id" in page["parent"]}
+
+    def context_links(self) -> int:
+        """context paragraphs appended to unit pages, i.e. links back to an occurrence"""
+        links = 0
+        for block in self.workspace.blocks.values():
+            if block["type"] != "paragraph":
+                continue
+            for run in block["paragraph"]["rich_text"]:
+                link = run.get("text", {}).get("link") or {}
+                links += (link.get("url") or "").startswith("https://www.notion.so/")
+        return links
+
+    def test_failed_writes_are_resent_on_resume(self):
+        operation = self.operation()
+        self.server.errors = {CREATE_ROUTE: 500, APPEND_ROUTE: 500}
+        operation.refresh_units_database_with_contexts(processes=1)
+        self.assertTrue(operation.batch_errors)
+        failed_pages = {page_id.replace("-", "") for page_id in operation.journal.unappended_pages()}
+        failed_pages &= self.child_pages()
+        self.assertTrue(failed_pages)
+        self.assertFalse(failed_pages & self.extracted_pages())
+        self.assertEqual(self.context_links(), 0)
+
+        self.server.errors = {}
+        self.server.reset_counts()
+        operation.refresh_units_database_with_contexts(resume=True, processes=1)
+        self.assertFalse(operation.batch_errors)
+        requests = self.server.requests
+        self.assertGreater(requests.get(CREATE_ROUTE, 0) + requests.get(APPEND_ROUTE, 0), 0)
+        self.assertTrue(failed_pages <= self.extracted_pages())
+        self.assertTrue(operation.journal.is_empty())
+        occurrences = operation.occurrence_index.count()
+        self.assertEqual(self.context_links(), occurrences)
+
+
+class FlakyNotion:
+    """client whose first append_block_children calls fail with the given statuses"""
+
+    def __init__(self, *append_errors: int):
+        self.append_errors = list(append_errors)
+        self.appended = []
+
+    def append_block_children(self, block_id, children):
+        if self.append_errors:
+            status = self.append_errors.pop(0)
+            raise NotionAPIError(f"{status}: failed", status)
+        self.appended.append((block_id, len(children)))
+        return {"object": "list", "results": children}
+
+
+class QueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.state_dir.name, "queue.sqlite3")
+        self.store = WriteQueueStore(path, NotionAPI.CHILDREN_PER_REQUEST)
+
+    def tearDown(self):
+        self.store.close()
+        self.state_dir.cleanup()
+
+
+class AppendRetryTest(QueueTestCase):
+    """an append that may have been applied is never sent again; one rejected before any work is"""
+
+    def deliver(self, notion: FlakyNotion) -> WriteBehind:
+        writes = WriteBehind(self.store, notion, workers=2)
+        children = [{"type": "paragraph"}] * 3
+        writes.append_block_children("page", children, meta={"occurrences": [["block", "unit", "page"]]})
+        writes.start()
+        writes.stop()
+        return writes
+
+    def test_append_failed_with_5xx_is_not_resent(self):
+        notion = FlakyNotion(502)
+        writes = self.deliver(notion)
+        self.assertEqual(notion.appended, [])
+        failures = writes.failures()
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0][0].kind, "append")
+        self.assertIn("502", failures[0][1])
+
+    def test_append_rate_limited_is_resent(self):
+        notion = FlakyNotion(429)
+        writes = self.deliver(notion)
+        self.assertEqual(notion.appended, [("page", 3)])
+        self.assertEqual(writes.failures(), [])
+
+
+class SlowNotion(FlakyNotion):
+    def append_block_children(self, block_id, children):
+        time.sleep(0.1)
+        return super().append_block_children(block_id, children)
+
+
+class StopTest(QueueTestCase):
+    """stop(flush=False) leaves what was not sent in the durable queue"""
+
+    def test_stop_without_flush_keeps_unsent_writes(self):
+        notion = SlowNotion()
+        writes = WriteBehind(self.store, notion, workers=2)
+        for page in range(10):
+            writes.append_block_children(f"page{page}", [{"type": "paragraph"}])
+        writes.start()
+        writes.stop(flush=False)
+        self.assertLessEqual(len(notion.appended), 2)
+        self.assertEqual(len(notion.appended) + self.store.unsent(), 10)
+
+        # the next process sends the rest
+        writes = WriteBehind(self.store, notion, workers=2)
+        writes.start()
+        writes.stop()
+        self.assertEqual(len(notion.appended), 10)
+        self.assertEqual(self.store.unsent(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_NO_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "category", "args", "started", "child_time")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.child_time = 0.0
+
+    def __enter__(self):
+        self.tracer._stack().append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.started
+        stack = self.tracer._stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_time += duration
+        self.tracer._record(self, duration)
+
+
+class Tracer:
+    """
+    Spans of the stages of a run, nested per thread: a span opened while another is open on the same thread is its
+    child. Disabled (the default) span() hands out a shared no-op context manager, so instrumented code pays one
+    attribute check per span. Only synchronous code nests correctly; spans are per thread, not per asyncio task.
+    Finished spans export to the Chrome trace format (chrome://tracing, Perfetto) and sum up into a per-stage
+    breakdown of calls, total time and self time (total minus the time of child spans).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+        # (name, category, start (s since origin), duration, self time, thread id, args)
+        self._events: List[Tuple[str, str, float, float, float, int, Dict[str, Any]]] = []
+        self._thread_names: Dict[int, str] = {}
+
+    def enable(self):
+        self.reset()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._events = []
+            self._thread_names = {}
+            self._origin = time.perf_counter()
+
+    def span(self, name: str, category: str = "stage", **args):
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, category, args)
+
+    def _stack(self) -> List[_Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, span: _Span, duration: float):
+        thread = threading.current_thread()
+        event = (
+            span.name,
+            span.category,
+            span.started - self._origin,
+            duration,
+            duration - span.child_time,
+            thread.ident,
+            span.args,
+        )
+        with self._lock:
+            self._events.append(event)
+            self._thread_names.setdefault(thread.ident, thread.name)
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        """{span name: {"calls", "total_s", "self_s"}}, by decreasing self time"""
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            events = list(self._events)
+        for name, _, _, duration, self_time, _, _ in events:
+            stats = totals.setdefault(name, {"calls": 0, "total_s": 0.0, "self_s": 0.0})
+            stats["calls"] += 1
+            stats["total_s"] += duration
+            stats["self_s"] += self_time
+        return dict(sorted(totals.items(), key=lambda item: -item[1]["self_s"]))
+
+    def format_breakdown(self) -> str:
+        lines = [f"{'span':<40} {'calls':>7} {'total s':>9} {'self s':>9}"]
+        for name, stats in self.breakdown().items():
+            lines.append(f"{name:<40} {stats['calls']:>7} {stats['total_s']:>9.3f} {stats['self_s']:>9.3f}")
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, path: str):
+        """complete ("X") events in microseconds, plus a thread name per thread"""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+        trace_events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in thread_names.items()
+        ]
+        for name, category, start, duration, _, tid, args in events:
+            event = {"name": name, "cat": category, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6}
+            event.update(pid=pid, tid=tid)
+            if args:
+                event["args"] = {key: str(value) for key, value in args.items()}
+            trace_events.append(event)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+
+# the tracer every instrumented module reports to
+TRACER = Tracer()
+span = TRACER.span
+
+
+def traced(name: Optional[str] = None, category: str = "stage") -> Callable:
+    """decorator running each call of a function in a span, named after the function unless name is given"""
+
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return fn(*args, **kwargs)
+            with TRACER.span(span_name, category):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class StackSampler:
+    """
+    Sampled profile: a background thread reads the Python stack of every other thread each interval seconds and
+    counts the stacks seen. Threads parked in Python-level waits (locks, queues, selectors) are dropped; time blocked
+    inside a C call (socket read, sleep) still counts towards the Python function making it, so the profile shows
+    where threads spend their time, computing or waiting on I/O, and cpu_s next to wall_s tells the two apart.
+    Stacks are written in the folded format read by flamegraph.pl and speedscope.
+    """
+
+    # a sampled thread whose innermost frame is in one of these modules is waiting, not computing
+    _IDLE_MODULES = ("threading.py", "queue.py", "selectors.py", "socket.py", "ssl.py", "connection.py")
+    _IDLE_FUNCTIONS = frozenset(("sleep", "acquire", "wait", "select", "recv_into", "readinto", "_worker"))
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        # process CPU time and wall time between start() and stop()
+        self.cpu_s = 0.0
+        self.wall_s = 0.0
+        self._counts: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StackSampler":
+        self._stop.clear()
+        self._started = (time.process_time(), time.perf_counter())
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self.cpu_s = time.process_time() - self._started[0]
+            self.wall_s = time.perf_counter() - self._started[1]
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or self._is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                folded = ";".join(reversed(stack))
+                self._counts[folded] = self._counts.get(folded, 0) + 1
+                self.samples += 1
+
+    def _is_idle(self, frame) -> bool:
+        code = frame.f_code
+        return code.co_name in self._IDLE_FUNCTIONS or code.co_filename.endswith(self._IDLE_MODULES)
+
+    def top(self, n: int = 15) -> List[Tuple[str, int]]:
+        """(function, samples with it innermost), most sampled first"""
+        leaves: Dict[str, int] = {}
+        for folded, count in self._counts.items():
+            leaf = folded.rsplit(";", 1)[-1]
+            leaves[leaf] = leaves.get(leaf, 0) + count
+        return sorted(leaves.items(), key=lambda item: -item[1])[:n]
+
+    def write_folded(self, path: str):
+        with open(path, "w") as f:
+            for folded, count in sorted(self._counts.items()):
+                f.write(f"{folded} {count}\n")
@@ -0,0 +1,257 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from settings import _NotionID, _NotionObject
+
+# containers whose children can never hold a unit: table rows keep their text in cells, not in rich_text, and the
+# rows of an inline database are pages of that database, not children of the block
+DEFAULT_SKIP_TYPES = frozenset(("table", "child_database"))
+
+
+class TraversalPolicy:
+    """
+    Which subtrees an unfolder fetches. The children of a block (or the content of a child page) are left out when:
+    - its type is in skip_types, or container_types is given and its type is not in it;
+    - it sits at max_depth or deeper (the children of the root are at depth 1, the depth goes on through child pages);
+    - max_blocks blocks of the tree have been listed already, which also stops the remaining pages of long listings.
+    The block itself is still listed, and extracted, either way; only what is below it is never fetched.
+    """
+
+    def __init__(
+        self,
+        skip_types: Iterable[str] = DEFAULT_SKIP_TYPES,
+        container_types: Optional[Iterable[str]] = None,
+        max_depth: Optional[int] = None,
+        max_blocks: Optional[int] = None,
+    ):
+        self.skip_types = frozenset(skip_types)
+        self.container_types = frozenset(container_types) if container_types is not None else None
+        self.max_depth = max_depth
+        self.max_blocks = max_blocks
+
+    def skip_reason(self, block: _NotionObject, depth: int) -> Optional[str]:
+        """why the subtree of a block at that depth is left out ("type" or "depth"); None to descend into it"""
+        block_type = block["type"]
+        if block_type in self.skip_types:
+            return "type"
+        if self.container_types is not None and block_type not in self.container_types:
+            return "type"
+        if self.max_depth is not None and depth >= self.max_depth:
+            return "depth"
+        return None
+
+
+# fetch everything: what the unfolders did before policies existed
+UNLIMITED = TraversalPolicy(skip_types=())
+
+
+class TraversalStats:
+    """
+    Thread-safe counters of the traversals of one client: blocks listed, listing requests made, subtrees skipped per
+    reason and block type, and listing requests avoided by skipping (a lower bound: one per skipped subtree or
+    listing page, whatever lies deeper in it is not counted).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+    def add(self, key: str, n: int = 1):
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + n
+
+    def skipped(self, reason: str, block_type: str):
+        with self._lock:
+            for key in (f"skipped.{reason}.{block_type}", "subtrees_skipped", "requests_avoided"):
+                self._counts[key] = self._counts.get(key, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(sorted(self._counts.items()))
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+class ConcurrentUnfolder:
+    """
+    Breadth-first unfolding of a block tree with a bounded worker pool.
+    The frontier is iterative (no Python recursion), sibling subtrees are fetched in parallel, and the sync check of
+    each child_page runs as its own task so it overlaps with other fetches. Listings are fetched page by page:
+    fetch_children(block_id, start_cursor) returns (children, next_cursor), and the next page of a long listing is
+    requested while the blocks of the current one are already being descended into.
+    Results are put back in document order (depth-first pre-order, as a recursive walk would return them) once the
+    whole tree is in.
+    policy decides which subtrees are fetched at all (everything by default). A child page whose content it leaves
+    out is dropped like a synced one, without a sync check. A page cut short by max_blocks is still reported as to
+    sync, so it is marked extracted and its first blocks are not extracted again by every run; the blocks past the
+    limit are only read once the page is edited. Each truncated page is counted (pages_truncated) and warned about.
+    stats, when given, counts what was fetched and what was skipped.
+    """
+
+    def __init__(
+        self,
+        fetch_children: Callable[[_NotionID, Optional[str]], Tuple[List[_NotionObject], Optional[str]]],
+        is_synced: Callable[[_NotionObject], bool],
+        max_workers: int = 8,
+        policy: TraversalPolicy = UNLIMITED,
+        stats: Optional[TraversalStats] = None,
+    ):
+        self.fetch_children = fetch_children
+        self.is_synced = is_synced
+        self.max_workers = max_workers
+        self.policy = policy
+        self.stats = stats if stats is not None else TraversalStats()
+
+    def unfold(self, root_id: _NotionID) -> Tuple[List[_NotionObject], List[_NotionObject]]:
+        """
+        return (flat_block_children, child_pages_to_sync) for the tree under root_id.
+        every block gets a parent_page_id: the closest enclosing page, which is root_id or an unsynced child_page.
+        synced child pages are dropped together with their whole subtree.
+        """
+        children_of: Dict[_NotionID, List[_NotionObject]] = {}
+        synced_pages: Set[_NotionID] = set()
+        truncated_pages: Set[_NotionID] = set()
+        for event, target, payload in self._walk(root_id):
+            if event == "children":
+                # pages of one listing arrive in order, since each is only requested after the previous one
+                children_of.setdefault(target, []).extend(payload)
+            elif event in ("synced", "skipped"):
+                synced_pages.add(target["id"])
+            elif event == "truncated":
+                truncated_pages.add(target)
+        self._report_truncated(truncated_pages)
+        return self._in_document_order(root_id, children_of, synced_pages)
+
+    def iter_unfold(
+        self,
+        root_id: _NotionID,
+        child_pages_to_sync: List[_NotionObject],
+        extract: Optional[Callable[[_NotionObject], List[_NotionObject]]] = None,
+    ) -> Iterator[_NotionObject]:
+        """
+        streaming variant of unfold(): yield blocks as soon as their listing (or sync check) comes back, in arrival
+        order rather than document order, and append unsynced child pages to child_pages_to_sync along the way.
+        nothing is retained once yielded, so memory stays flat however large the tree is.
+        with extract, each block is replaced by what extract returns for it as its listing arrives, so blocks it
+        returns nothing for are dropped right there (descending into them is not affected).
+        """
+        truncated_pages: Set[_NotionID] = set()
+        for event, target, payload in self._walk(root_id):
+            if event == "children":
+                # child pages are held back until their sync check tells whether they are kept
+                for block_child in payload:
+                    if block_child["type"] != "child_page":
+                        if extract is None:
+                            yield block_child
+                        else:
+                            yield from extract(block_child)
+            elif event == "unsynced":
+                child_pages_to_sync.append(target)
+                if extract is None:
+                    yield target
+                else:
+                    yield from extract(target)
+            elif event == "truncated":
+                truncated_pages.add(target)
+        self._report_truncated(truncated_pages)
+
+    def _report_truncated(self, page_ids: Set[_NotionID]):
+        for page_id in sorted(page_ids):
+            self.stats.add("pages_truncated")
+            print(
+                f"Page {page_id} was cut short at {self.policy.max_blocks} blocks (UNFOLD_MAX_BLOCKS); the blocks past "
+                "the limit are left out until the page is edited again."
+            )
+
+    def _walk(self, root_id: _NotionID) -> Iterator[Tuple[str, Any, Any]]:
+        """
+        drive the frontier and yield events as tasks complete:
+        ("children", block_id, block_children) for every page of a listing, then ("synced" | "unsynced", child_page,
+        None) once the sync check of each child page in it returns, ("skipped", child_page, None) for a child page
+        the policy leaves out and ("truncated", page_id, None) for a page whose content max_blocks cut short.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="unfold")
+        # future -> (kind, block_id or child_page, parent_page_id, depth of the block)
+        pending: Dict[Future, Tuple[str, Any, _NotionID, int]] = {}
+        policy, stats = self.policy, self.stats
+        listed = 0
+
+        def submit_children(
+            block_id: _NotionID, parent_page_id: _NotionID, depth: int, start_cursor: Optional[str] = None
+        ):
+            future = executor.submit(self.fetch_children, block_id, start_cursor)
+            pending[future] = ("children", block_id, parent_page_id, depth)
+            stats.add("listing_requests")
+
+        def out_of_budget() -> bool:
+            return policy.max_blocks is not None and listed >= policy.max_blocks
+
+        try:
+            submit_children(root_id, root_id, 0)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, target, parent_page_id, depth = pending.pop(future)
+                    if kind == "children":
+                        block_children, next_cursor = future.result()
+                        listed += len(block_children)
+                        stats.add("blocks", len(block_children))
+                        left_out = []
+                        if next_cursor is not None:
+                            if out_of_budget():
+                                stats.skipped("max_blocks", "listing_page")
+                                left_out.append(("truncated", parent_page_id, None))
+                            else:
+                                submit_children(target, parent_page_id, depth, next_cursor)
+                        for block_child in block_children:
+                            block_child["parent_page_id"] = parent_page_id
+                            is_page = block_child["type"] == "child_page"
+                            if not (is_page or block_child["has_children"]):
+                                continue
+                            reason = policy.skip_reason(block_child, depth + 1)
+                            if reason is None and out_of_budget():
+                                reason = "max_blocks"
+                                left_out.append(("truncated", parent_page_id, None))
+                            if reason is not None:
+                                stats.skipped(reason, block_child["type"])
+                                if is_page:
+                                    left_out.append(("skipped", block_child, None))
+                            elif is_page:
+                                pending[executor.submit(self.is_synced, block_child)] = (
+                                    "sync",
+                                    block_child,
+                                    parent_page_id,
+                                    depth + 1,
+                                )
+                            else:
+                                submit_children(block_child["id"], parent_page_id, depth + 1)
+                        yield "children", target, block_children
+                        yield from left_out
+                    elif future.result():
+                        # if the child_page is synced, skip it and its children
+                        yield "synced", target, None
+                    else:
+                        if target["has_children"]:
+                            # blocks inside an unsynced child page are attributed to that page
+                            submit_children(target["id"], target["id"], depth)
+                        yield "unsynced", target, None
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _in_document_order(
+        self, root_id: _NotionID, children_of: Dict[_NotionID, List[_NotionObject]], synced_pages: Set[_NotionID]
+    ) -> Tuple[List[_NotionObject], List[_NotionObject]]:
+        flat_block_children = []
+        child_pages_to_sync = []
+        stack = list(reversed(children_of.get(root_id, [])))
+        while stack:
+            block_child = stack.pop()
+            if block_child["id"] in synced_pages:
+                continue
+            if block_child["type"] == "child_page":
+                child_pages_to_sync.append(block_child)
+            flat_block_children.append(block_child)
+            stack.extend(reversed(children_of.get(block_child["id"], [])))
+        return flat_block_children, child_pages_to_sync
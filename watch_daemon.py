@@ -0,0 +1,227 @@
+import argparse
+import json
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+from main import SyntheticOperation
+
+
+class WatchDaemon:
+    """
+    Keeps one SyntheticOperation resident, so its unit index, read cache, sync state and dictionary cache stay warm,
+    and polls the main database for contexts edited since the last poll; only those are refreshed, after their cached
+    reads are dropped. The poll interval halves after a poll that found changes and grows by half after a quiet
+    one, within [min_interval, max_interval]. A full sweep over every context still runs every full_sweep_interval
+    seconds: edits inside a nested child page do not touch the context page itself, and the sync store keeps such a
+    sweep down to the pages that did change.
+    A local control endpoint answers GET /status and POST /refresh (?full=1 for a full sweep) on host:port.
+    """
+
+    def __init__(
+        self,
+        operation: Optional[SyntheticOperation] = None,
+        min_interval: float = 30.0,
+        max_interval: float = 600.0,
+        full_sweep_interval: float = 3600.0,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+    ):
+        self.operation = operation or SyntheticOperation()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.full_sweep_interval = full_sweep_interval
+        self.interval = min_interval
+        self.host = host
+        self.port = port
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._full_requested = False
+        self._server: Optional[ThreadingHTTPServer] = None
+        # edits at or after the watermark are picked up by the next poll; None forces a full sweep
+        self._watermark: Optional[str] = None
+        # context id -> last_edited_time it was last refreshed at; the watermark slack re-reports recent edits
+        self._refreshed_versions: Dict[str, str] = {}
+        self._last_full_sweep = 0.0
+        self._next_poll = 0.0
+        self._status: Dict[str, Any] = {
+            "state": "starting",
+            "started_at": self._now().isoformat(),
+            "polls": 0,
+            "refreshes": 0,
+            "last_poll": None,
+            "last_refresh": None,
+            "last_error": None,
+        }
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    # control
+    def request_refresh(self, full: bool = False):
+        """run a poll now instead of at the end of the current interval"""
+        with self._lock:
+            self._full_requested = self._full_requested or full
+        self._wake.set()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            status = dict(self._status)
+        status["interval_s"] = round(self.interval, 1)
+        status["next_poll_in_s"] = round(max(0.0, self._next_poll - time.monotonic()), 1)
+        status["read_cache"] = self.operation.CEpages.notion_api_call.cache_stats()
+        return status
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    # loop
+    def serve_forever(self):
+        """start the control endpoint and poll until stop() (or Ctrl-C)"""
+        self._start_control_endpoint()
+        try:
+            while not self._stop.is_set():
+                self._set_status(state="polling")
+                changed = self.poll_once()
+                self._adapt_interval(changed)
+                self._next_poll = time.monotonic() + self.interval
+                self._set_status(state="idle")
+                self._wake.wait(self.interval)
+                self._wake.clear()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self._server is not None:
+                self._server.shutdown()
+                self._server.server_close()
+            self.operation.unit_index.save()
+
+    def poll_once(self) -> int:
+        """one poll, plus a refresh of whatever changed; return the number of contexts refreshed"""
+        with self._lock:
+            full = self._full_requested or self._watermark is None
+            full = full or time.monotonic() - self._last_full_sweep >= self.full_sweep_interval
+            self._full_requested = False
+        poll_started = self._now()
+        operation = self.operation
+        notion = operation.CEpages.notion_api_call
+        try:
+            if full:
+                # a sweep rereads everything, so stale listings cannot survive it
+                notion.clear_cache()
+                contexts = operation.CEpages.get_contexts_from_database(operation.MAINDATABASE_ID)
+            else:
+                contexts = operation.CEpages.get_contexts_from_database(
+                    operation.MAINDATABASE_ID, edited_since=self._watermark
+                )
+                contexts = [
+                    context
+                    for context in contexts
+                    if self._refreshed_versions.get(context["id"]) != context["last_edited_time"]
+                ]
+                for context in contexts:
+                    notion.invalidate_tree(context["id"])
+            refreshed = self._refresh(contexts, full) if contexts else 0
+        except Exception as e:
+            # the daemon outlives a failed poll; the watermark stays, so the next poll retries the same window
+            self._set_status(last_error={"at": self._now().isoformat(), "error": repr(e)})
+            if operation.debug:
+                traceback.print_exc()
+            return 0
+        # the slack covers clock skew and edits made while the poll query was in flight
+        self._watermark = (poll_started - timedelta(minutes=1)).isoformat()
+        if full:
+            self._last_full_sweep = time.monotonic()
+        with self._lock:
+            self._status["polls"] += 1
+            self._status["last_poll"] = {"at": poll_started.isoformat(), "full": full, "contexts": refreshed}
+        # a full sweep says nothing about the edit rate, so it never tightens the interval
+        return 0 if full else refreshed
+
+    def _refresh(self, contexts: List[Dict[str, Any]], full: bool) -> int:
+        started = time.perf_counter()
+        self._set_status(state="refreshing")
+        context_ids = [context["id"] for context in contexts]
+        self.operation.refresh_units_database_with_contexts(context_ids=context_ids, clear_cache=False)
+        for context in contexts:
+            self._refreshed_versions[context["id"]] = context["last_edited_time"]
+        with self._lock:
+            self._status["refreshes"] += 1
+            self._status["last_refresh"] = {
+                "at": self._now().isoformat(),
+                "full": full,
+                "contexts": len(contexts),
+                "duration_s": round(time.perf_counter() - started, 3),
+                "failed_batches": len(self.operation.batch_errors),
+            }
+        return len(contexts)
+
+    def _adapt_interval(self, changed: int):
+        if changed:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+
+    def _set_status(self, **fields):
+        with self._lock:
+            self._status.update(fields)
+
+    # control endpoint
+    def _start_control_endpoint(self):
+        daemon = self
+
+        class _ControlHandler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if urlparse(self.path).path == "/status":
+                    self._send(200, daemon.status())
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path == "/refresh":
+                    full = parse_qs(url.query).get("full", ["0"])[0] in ("1", "true")
+                    daemon.request_refresh(full=full)
+                    self._send(202, {"scheduled": "full" if full else "poll"})
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def _send(self, status: int, payload: Dict[str, Any]):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _ControlHandler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="watch-control", daemon=True).start()
+        print(f"watching; control endpoint on http://{self.host}:{self.port} (GET /status, POST /refresh)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the unit databases in sync with the contexts as they change.")
+    parser.add_argument("--min-interval", type=float, default=30.0, help="shortest seconds between polls")
+    parser.add_argument("--max-interval", type=float, default=600.0, help="longest seconds between polls")
+    parser.add_argument("--full-sweep-interval", type=float, default=3600.0, help="seconds between full sweeps")
+    parser.add_argument("--host", default="127.0.0.1", help="address of the control endpoint")
+    parser.add_argument("--port", type=int, default=8765, help="port of the control endpoint (0: any free port)")
+    args = parser.parse_args()
+    daemon = WatchDaemon(
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        full_sweep_interval=args.full_sweep_interval,
+        host=args.host,
+        port=args.port,
+    )
+    daemon.serve_forever()
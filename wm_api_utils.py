@@ -1,8 +1,15 @@
 import os
-import requests
 import json
 import re
-from settings import DEBUG
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+from settings import DEBUG, MW_BASE_URL
+from cache_utils import DiskCache
+from metrics_utils import HTTPMetrics
+from http_utils import HTTPTransport, TokenBucket
+from trace_utils import span, traced
 
 
 class MWAPIError(Exception):
@@ -11,23 +18,95 @@ class MWAPIError(Exception):
     pass
 
 
-class MerriamWebsterAPI:
-    BASE_URL = "https://www.dictionaryapi.com/api/v3/references/collegiate/json/"
+class MWWordNotFoundError(MWAPIError):
+    """The word is not in the dictionary; MW answered with a (possibly empty) list of suggestions."""
+
+    pass
 
-    def __init__(self, api_key: str):
+
+class MerriamWebsterAPI:
+    BASE_URL = MW_BASE_URL
+    # known misses are re-checked sooner than hits, in case the dictionary gains the word
+    NEGATIVE_TTL = 7 * 24 * 3600
+
+    def __init__(
+        self,
+        api_key: str,
+        cache: Optional[DiskCache] = None,
+        metrics: Optional[HTTPMetrics] = None,
+        transport: Optional[HTTPTransport] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+    ):
         if not api_key:
             raise MWAPIError("No API key provided")
         self.api_key = api_key
+        # pooled keep-alive transport; a recording or replay transport can be swapped in
+        self.transport = transport or HTTPTransport()
+        # persistent lookups cache keyed by normalized headword; None disables caching
+        self.cache = cache
+        # request metrics shared with the Notion client; None disables instrumentation
+        self.metrics = metrics
+        # budget for dictionary requests, separate from Notion's; cache hits never draw from it. None: unlimited
+        self.rate_limiter = rate_limiter
+
+    def _cache_key(self, word: str) -> str:
+        return " ".join(word.strip().lower().split())
 
     def get_word_mw_response(self, word):
+        cached = self._cached_entry(word)
+        if cached is not None and "response" in cached:
+            return cached["response"]
+        response_json = self._fetch_word(word)
+        self._cache_store(word, {"response": response_json})
+        return response_json
+
+    @traced("MerriamWebsterAPI.get_word_CE")
+    def get_word_CE(self, word: str) -> list[dict]:
+        """response_to_CE(get_word_mw_response(word)), with the reduced form cached too so hits skip the parse"""
+        cached = self._cached_entry(word)
+        if cached is not None and "ce" in cached:
+            return cached["ce"]
+        response_json = cached["response"] if cached is not None else self._fetch_word(word)
+        simple_dicts = self.response_to_CE(response_json)
+        self._cache_store(word, {"response": response_json, "ce": simple_dicts})
+        return simple_dicts
+
+    def _cached_entry(self, word: str) -> Optional[dict]:
+        """return the cached entry of a word, raising the cached error again for a known miss"""
+        if self.cache is None:
+            return None
+        cached = self.cache.get(self._cache_key(word))
+        if cached is not None and "miss" in cached:
+            raise MWWordNotFoundError(cached["miss"])
+        return cached
+
+    def _cache_store(self, word: str, entry: dict):
+        if self.cache is not None:
+            self.cache.put(self._cache_key(word), entry)
+
+    def _fetch_word(self, word: str):
         # Construct the URL
         url = f"{self.BASE_URL}{word}?key={self.api_key}"
 
         # Make the request
-        response = requests.get(url)
+        if self.rate_limiter is not None:
+            with span("mw.rate_limit_wait", "wait"):
+                self.rate_limiter.acquire()
+        started = time.perf_counter()
+        with span("mw.collegiate", "api"):
+            response = self.transport.request("GET", url)
+        if self.metrics is not None:
+            latency = time.perf_counter() - started
+            self.metrics.observe("mw", "GET", "collegiate", response.status_code, latency, 0, len(response.content))
         if DEBUG:
             print(json.dumps(response.json(), indent=4))
-        return self._handling_response(response)
+        try:
+            return self._handling_response(response)
+        except MWWordNotFoundError as e:
+            # only "not found" is cached; quota, auth and server errors are retried on the next lookup
+            if self.cache is not None:
+                self.cache.put(self._cache_key(word), {"miss": str(e)}, ttl=self.NEGATIVE_TTL)
+            raise
 
     def _handling_response(self, response):
         # Extract data from the response
@@ -38,12 +117,14 @@ class MerriamWebsterAPI:
                 json.dump(response_json, f, indent=4)
 
         # Check if the request was successful and the data is a list
+        if response_json == []:
+            raise MWWordNotFoundError("Error, word not found and no suggestions returned.")
         if not response_json or not isinstance(response_json, list):
             raise MWAPIError(
                 f"Error fetching data or unexpected data format: status_code = {response.status_code}; data = {response_json}"
             )
-        if "shortdef" not in response_json[0]:
-            raise MWAPIError(
+        if not isinstance(response_json[0], dict) or "shortdef" not in response_json[0]:
+            raise MWWordNotFoundError(
                 f"Error, most likely word not found and list of suggestions returned: data = {response_json}"
             )
 
@@ -86,6 +167,43 @@ class MerriamWebsterAPI:
         return url
 
 
+class WordPrefetcher:
+    """
+    Looks words up ahead of page creation: prefetch() starts a lookup on a bounded worker pool and returns at once,
+    the same word (after normalization) is only ever looked up once, and get_word_CE() hands out the result,
+    waiting only for whatever part of the lookup has not finished yet. Lookups go through the MerriamWebsterAPI, so
+    its cache and rate limiter apply.
+    """
+
+    def __init__(self, mw_api: MerriamWebsterAPI, max_workers: int = 4):
+        self.mw_api = mw_api
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mw-prefetch")
+        self._lock = threading.Lock()
+        # normalized word -> lookup of response_to_CE(...)
+        self._lookups: Dict[str, Future] = {}
+
+    def prefetch(self, word: str) -> Future:
+        key = self.mw_api._cache_key(word)
+        with self._lock:
+            lookup = self._lookups.get(key)
+            if lookup is None:
+                lookup = self._lookups[key] = self._executor.submit(self.mw_api.get_word_CE, word)
+        return lookup
+
+    def get_word_CE(self, word: str) -> list[dict]:
+        """same as MerriamWebsterAPI.get_word_CE(), served from the prefetched lookup (started now if it was not)"""
+        return self.prefetch(word).result()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 if __name__ == "__main__":
     mw = MerriamWebsterAPI(api_key=os.environ.get("MERRIAM_WEBSTER_KEY"))
     response_json = mw.get_word_mw_response("contingency")
@@ -0,0 +1,195 @@
+import threading
+import traceback
+import requests
+from typing import Any, Callable, Dict, List, Optional
+from settings import _NotionID, _NotionObject
+from store_utils import WriteQueueStore, PendingWrite
+from trace_utils import span
+
+# called with (meta, response) once a write of that kind is delivered
+_DoneHandler = Callable[[Dict[str, Any], _NotionObject], None]
+# called with (meta, payload) right before a write of that kind is sent; returns the payload to send
+_SendHandler = Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]
+# called with (write, error) once a write of that kind is given up on
+_FailedHandler = Callable[[PendingWrite, Exception], None]
+
+
+class WriteBehind:
+    """
+    Write-behind for the mutations of a run: create_page, append_block_children and update_page are queued in a
+    durable WriteQueueStore, which coalesces them per target page, and workers threads send them through the Notion
+    client (so under its rate limiter) while the run goes on reading. flush() waits until everything queued is sent.
+    on_done handlers, per write kind, run after each delivery with the write's metadata, e.g. to record a created page
+    in the unit index; metadata is stored with the write, so writes left over by an interrupted process are handled
+    the same way once a later process drains them. on_send handlers, per write kind, complete a payload right before
+    each attempt, for what must be decided at send time rather than when queueing (e.g. a timestamp).
+    A failed write is retried max_attempts times in all (on top of the client's own retries), then kept as a failure,
+    see failures(), and handed to the on_failed handler of its kind. Creations and appends are not idempotent: they
+    are only retried when the failed attempt cannot have been applied (see _retryable), since sending them twice
+    leaves two pages under one title or two copies of the same contexts.
+    """
+
+    def __init__(
+        self,
+        store: WriteQueueStore,
+        notion_api_call,
+        workers: int = 4,
+        max_attempts: int = 3,
+        on_done: Optional[Dict[str, _DoneHandler]] = None,
+        on_send: Optional[Dict[str, _SendHandler]] = None,
+        on_failed: Optional[Dict[str, _FailedHandler]] = None,
+        debug: bool = False,
+    ):
+        self.store = store
+        self.notion_api_call = notion_api_call
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.on_done = on_done or {}
+        self.on_send = on_send or {}
+        self.on_failed = on_failed or {}
+        self.debug = debug
+        self._changed = threading.Condition()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+
+    # queueing
+    def create_page(
+        self,
+        database_id: _NotionID,
+        title: str,
+        properties: Dict[str, Any],
+        children: List[_NotionObject],
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """queue the creation of a page; the returned placeholder id can be written to right away"""
+        placeholder = self.store.enqueue_create(database_id, title, properties, children, meta or {})
+        self._notify()
+        return placeholder
+
+    def append_block_children(
+        self, block_id: str, children: List[_NotionObject], meta: Optional[Dict[str, Any]] = None
+    ):
+        # one queued write never holds more than a request can carry; only the first chunk carries the metadata
+        step = self.store.children_per_request
+        for start in range(0, len(children), step):
+            self.store.enqueue_append(block_id, children[start : start + step], (meta or {}) if start == 0 else {})
+        self._notify()
+
+    def update_page(self, page_id: str, properties: Dict[str, Any], meta: Optional[Dict[str, Any]] = None):
+        self.store.enqueue_update(page_id, properties, meta or {})
+        self._notify()
+
+    def page_for(self, database_id: _NotionID, title: str) -> Optional[str]:
+        """id (or placeholder) of the page queued for creation under that title, if any"""
+        return self.store.page_for(database_id, title)
+
+    # draining
+    def start(self):
+        if self._threads:
+            return
+        self._stopping = False
+        for worker in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"write-behind-{worker}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def flush(self):
+        """block until every queued write is delivered or failed"""
+        if not self._threads:
+            raise RuntimeError("flush() needs the workers running, see start().")
+        with self._changed:
+            while self.store.unsent():
+                self._changed.wait(0.5)
+        self.store.prune()
+
+    def stop(self, flush: bool = True):
+        """
+        stop the workers, with flush once the queue is drained; without, as soon as each is done with its write in
+        flight, and what is left stays queued for the next process to send
+        """
+        if not self._threads:
+            return
+        if flush:
+            self.flush()
+        with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def failures(self) -> List[tuple]:
+        """(write, error) of the writes given up on, oldest first"""
+        return self.store.failures()
+
+    def clear_failures(self):
+        self.store.clear_failures()
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _work(self):
+        while True:
+            with self._changed:
+                write = None
+                while not self._stopping:
+                    write = self.store.claim()
+                    if write is not None:
+                        break
+                    # nothing sendable: everything waits behind a write in flight, or the queue is empty
+                    self._changed.wait(0.5)
+                if write is None:
+                    return
+            self._deliver(write)
+            self._notify()
+
+    def _deliver(self, write: PendingWrite):
+        notion = self.notion_api_call
+        try:
+            with span(f"write_behind.{write.kind}", "write"):
+                payload = write.payload
+                prepare = self.on_send.get(write.kind)
+                if prepare is not None:
+                    payload = prepare(write.meta, payload)
+                if write.kind == "create":
+                    response = notion.create_page(payload["database_id"], payload["properties"], payload["children"])
+                elif write.kind == "append":
+                    response = notion.append_block_children(write.target, payload["children"])
+                else:
+                    response = notion.update_page(write.target, payload["properties"])
+        except Exception as e:
+            if self.debug:
+                traceback.print_exc()
+            if self._retryable(write, e) and write.attempts + 1 < self.max_attempts:
+                self.store.retry(write, repr(e))
+            else:
+                self.store.fail(write, repr(e))
+                self._handle_failure(write, e)
+            return
+        handler = self.on_done.get(write.kind)
+        if handler is not None:
+            # before the write leaves the queue, so a page being created is always findable through one or the other
+            try:
+                handler(write.meta, response)
+            except Exception as e:
+                print(f"Handling the delivered {write.kind} to {write.target} failed: {e!r}")
+        self.store.complete(write, response.get("id") if write.kind == "create" else None)
+
+    def _handle_failure(self, write: PendingWrite, error: Exception):
+        handler = self.on_failed.get(write.kind)
+        if handler is not None:
+            try:
+                handler(write, error)
+            except Exception as e:
+                print(f"Handling the failed {write.kind} to {write.target} failed: {e!r}")
+
+    @staticmethod
+    def _retryable(write: PendingWrite, error: Exception) -> bool:
+        """
+        a creation or append failed on a 429 or before reaching Notion (connection timeout) was not applied; after any
+        other error, e.g. a 5xx or a read timeout, it may have been. Property updates can always be sent again.
+        """
+        if write.kind == "update":
+            return True
+        return isinstance(error, requests.exceptions.ConnectTimeout) or getattr(error, "status_code", None) == 429